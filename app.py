@@ -4,7 +4,6 @@
 import streamlit as st
 import os
 import time
-import re
 
 # Import local modules
 from utils.session_state import initialize_session_state
@@ -13,8 +12,12 @@ from services.web_scraping.youtube import extract_transcript_details
 from services.web_scraping.wikipedia import extract_wikipedia_content
 from services.web_scraping.static_scraper import extract_static_webpage_content
 from services.web_scraping.dynamic_scraper import extract_dynamic_webpage_content
-from services.llm_service import answer_question, process_large_content
-from services.vector_db import get_or_create_collection
+from services.llm_service import answer_question, process_large_content, get_conversation_memory
+from services.vector_db import get_or_create_collection, collection_name_for_url, pin_collection, resolve_vector_store
+from services.llm_cache import get_completion_cache
+from services.embedding_cache import get_embedding_cache
+from services.collection_registry import get_collection_registry
+from services.global_index import GLOBAL_INDEX_ENABLED
 from prompts.prompt_templates import get_final_prompt_by_type
 
 # Load environment variables
@@ -87,14 +90,8 @@ def summarize_content(source_url):
     content = st.session_state.extracted_content
     url_type = st.session_state.url_type
     
-    # Generate a collection name based on the content source
-    collection_name = re.sub(r'[^a-zA-Z0-9_]', '_', st.session_state.page_title)[:40]
-    # Ensure it starts and ends with alphanumeric characters
-    collection_name = re.sub(r'^[._-]+', '', collection_name)
-    collection_name = re.sub(r'[._-]+$', '', collection_name) 
-
-    if len(collection_name) < 3:
-        collection_name = f"content_{collection_name}"
+    # Name the collection after the normalized URL so pages with similar titles never collide
+    collection_name = collection_name_for_url(source_url)
     
     st.session_state.collection_name = collection_name
     
@@ -112,6 +109,7 @@ def clear_conversation():
         st.session_state.chat_history = [initial_message]
     else:
         st.session_state.chat_history = []
+    get_conversation_memory().clear()
     st.success("Conversation history cleared!")
 
 # Main Streamlit app
@@ -152,6 +150,7 @@ with st.sidebar:
         if GROQ_API_KEY:
             st.session_state.url_processed = False
             st.session_state.chat_history = []
+            get_conversation_memory().clear()
             
             # Process the URL and extract content
             success, source_url = process_url(url, scraping_method, wait_time)
@@ -178,6 +177,47 @@ with st.sidebar:
         # Collection info
         st.subheader("Vector Database")
         st.write(f"Collection: {st.session_state.collection_name}")
+        # The collection may have been evicted to stay within the disk budget
+        if st.session_state.vector_db is not None:
+            st.session_state.vector_db = resolve_vector_store(st.session_state.vector_db)
+            if st.session_state.vector_db is None:
+                st.warning("The stored content was removed to free space; process the URL again to ask questions about it")
+        if st.session_state.vector_db is not None and not st.session_state.vector_db.persistent:
+            st.caption("Kept in memory for this session; processing the URL again or pinning it saves it to disk")
+        if st.button("Pin Collection"):
+            store, pinned = pin_collection(st.session_state.collection_name)
+            if store is None:
+                st.warning("This collection no longer exists; process the URL again to pin it")
+            else:
+                st.session_state.vector_db = store
+                if pinned:
+                    st.caption("Pinned: this collection is never evicted")
+                else:
+                    st.warning("Could not pin this collection")
+        if GLOBAL_INDEX_ENABLED:
+            st.checkbox("Answer from all processed sources", key="search_all_sources")
+            if st.session_state.search_all_sources:
+                st.multiselect("Only these content types", ["webpage", "wikipedia", "youtube"], key="search_source_types")
+        if hasattr(st.session_state.vector_db, "stats"):
+            store_stats = st.session_state.vector_db.stats()
+            compression = f", {store_stats['compression']:.1f}x smaller than float32" if store_stats["compression"] else ""
+            st.caption(
+                f"Index: {store_stats['index_type']}, {store_stats['records']} chunks, "
+                f"{store_stats['index_bytes'] / 1024 / 1024:.1f} MB in memory{compression}, "
+                f"{(store_stats['raw_vector_bytes'] + store_stats['side_store_bytes']) / 1024 / 1024:.1f} MB more on disk"
+            )
+
+        # LLM completion cache counters
+        cache = get_completion_cache()
+        if cache:
+            cache_stats = cache.stats()
+            st.caption(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+        embedding_cache = get_embedding_cache()
+        if embedding_cache:
+            embedding_stats = embedding_cache.stats()
+            st.caption(f"Embedding cache: {embedding_stats['hits']} hits, {embedding_stats['misses']} misses, {embedding_stats['entries']} vectors")
+        registry_totals = get_collection_registry().totals()
+        st.caption(f"Stored collections: {registry_totals['collections']}, {registry_totals['bytes'] / 1024 / 1024:.1f} MB")
 
         # Button to view the full extracted content
         if st.button("View Full Extracted Content"):
@@ -210,14 +250,15 @@ if st.session_state.url_processed:
         with st.chat_message("user"):
             st.write(user_question)
         
-        # Generate and display answer using vector search
+        # Generate and display answer using vector search, rendering tokens as they arrive
         with st.chat_message("assistant"):
             with st.spinner("Searching and thinking..."):
-                answer = answer_question(user_question)
-                st.write(answer)
+                answer_stream = answer_question(user_question, stream=True)
+            answer = st.write_stream(answer_stream)
                 
         # Add assistant response to chat history
         st.session_state.chat_history.append({"role": "assistant", "content": answer})
+        get_conversation_memory().add_turn(user_question, answer)
 else:
     st.info("Please enter a URL first to start chatting about its content.")
 
@@ -5,6 +5,16 @@ chunk_prompt = """You are summarizing a part of a larger content. Summarize this
 
 """
 
+# Prompt for merging a group of section summaries when there are too many for one final call
+section_merge_prompt = """You are merging summaries of consecutive sections of a larger content into one summary of that part. Keep every key fact, argument, name, and number, remove repetition, and preserve the order in which topics appear. Don't try to introduce or conclude the entire topic:
+
+"""
+
+# Prompt for folding older conversation turns into a rolling summary
+conversation_summary_prompt = """You are maintaining a running summary of a conversation between a user and an AI assistant about some content. Update the summary so far with the new messages. Keep the questions asked, the facts given in the answers, names, numbers, and any preferences the user stated. Write at most 200 words of plain prose:
+
+"""
+
 # Prompt for generating YouTube summary
 final_youtube_prompt = """You are an expert YouTube video summarizer with exceptional attention to detail.
 
@@ -0,0 +1,73 @@
+# services/answer_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Questions at least this similar (cosine) to a cached one reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+
+class SemanticAnswerCache:
+    """Per-collection cache of answers keyed by question embedding"""
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, collection_name, embedding):
+        """Return the cached answer for the most similar question above the threshold, or None"""
+        with self.lock:
+            entries = self.collections.get(collection_name)
+            if not entries:
+                return None
+
+            # Drop expired entries
+            now = time.time()
+            for key in [key for key, entry in entries.items() if now - entry[2] > self.ttl_seconds]:
+                del entries[key]
+            if not entries:
+                return None
+
+            keys = list(entries.keys())
+            matrix = np.stack([entries[key][0] for key in keys])
+            similarities = matrix @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entries.move_to_end(keys[best])
+            return entries[keys[best]][1]
+
+    def store(self, collection_name, question, embedding, answer):
+        """Cache an answer, evicting the least recently used entries beyond max_entries"""
+        with self.lock:
+            entries = self.collections.setdefault(collection_name, OrderedDict())
+            entries[question] = (self._normalize(embedding), answer, time.time())
+            entries.move_to_end(question)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, collection_name):
+        """Forget every cached answer for a collection"""
+        with self.lock:
+            self.collections.pop(collection_name, None)
+
+# Process-wide cache shared by every session
+_answer_cache = SemanticAnswerCache()
+
+def get_answer_cache():
+    """Return the shared semantic answer cache"""
+    return _answer_cache
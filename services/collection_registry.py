@@ -0,0 +1,215 @@
+# services/collection_registry.py
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+
+# Location of the registry of stored collections
+COLLECTION_REGISTRY_PATH = os.getenv("COLLECTION_REGISTRY_PATH", "./collection_registry/registry.sqlite3")
+
+# Budgets enforced by evicting the least recently used collections; 0 disables a limit
+COLLECTION_MAX_MB = float(os.getenv("COLLECTION_MAX_MB", "2048"))
+COLLECTION_MAX_COUNT = int(os.getenv("COLLECTION_MAX_COUNT", "200"))
+COLLECTION_TTL_DAYS = float(os.getenv("COLLECTION_TTL_DAYS", "30"))
+
+# Collections queried this recently are likely still open in a session and are not evicted
+COLLECTION_ACTIVE_MINUTES = float(os.getenv("COLLECTION_ACTIVE_MINUTES", "30"))
+
+# Queries refresh a collection's last access at most this often, to keep reads cheap
+TOUCH_INTERVAL_SECONDS = 60
+
+class CollectionRegistry:
+    """SQLite record of every stored collection: its source, size and last access"""
+
+    def __init__(self, path=COLLECTION_REGISTRY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.last_touched = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            "name TEXT PRIMARY KEY, backend TEXT NOT NULL, source TEXT, title TEXT, type TEXT, "
+            "chunks INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, last_access REAL NOT NULL, pinned INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS collections_last_access ON collections (last_access)")
+        # Registries created before summaries were kept lack the column
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(collections)")}
+        if "summary" not in columns:
+            self.conn.execute("ALTER TABLE collections ADD COLUMN summary TEXT")
+        self.conn.commit()
+
+    def record(self, name, backend, chunks, size_bytes, source=None, title=None, content_type=None, last_access=None, summary=None):
+        """Insert or refresh a collection after it was written"""
+        now = time.time()
+        last_access = now if last_access is None else last_access
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO collections (name, backend, source, title, type, chunks, bytes, created, last_access, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET backend = excluded.backend, "
+                "source = COALESCE(excluded.source, source), title = COALESCE(excluded.title, title), "
+                "type = COALESCE(excluded.type, type), chunks = excluded.chunks, bytes = excluded.bytes, "
+                "last_access = MAX(last_access, excluded.last_access), summary = COALESCE(excluded.summary, summary)",
+                (name, backend, source, title, content_type, chunks, size_bytes, now, last_access, summary)
+            )
+            self.conn.commit()
+            self.last_touched[name] = last_access
+
+    def touch(self, name):
+        """Mark a collection as used now"""
+        now = time.time()
+        with self.lock:
+            if now - self.last_touched.get(name, 0) < TOUCH_INTERVAL_SECONDS:
+                return
+            self.last_touched[name] = now
+            self.conn.execute("UPDATE collections SET last_access = ? WHERE name = ?", (now, name))
+            self.conn.commit()
+
+    def set_pinned(self, name, pinned=True):
+        """Pin a collection so it is never evicted, or unpin it; returns False for unknown names"""
+        with self.lock:
+            cursor = self.conn.execute("UPDATE collections SET pinned = ? WHERE name = ?", (int(pinned), name))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def remove(self, name):
+        """Forget a collection"""
+        with self.lock:
+            self.conn.execute("DELETE FROM collections WHERE name = ?", (name,))
+            self.conn.commit()
+            self.last_touched.pop(name, None)
+
+    def get(self, name):
+        """Return the record of a collection, or None"""
+        records = self._select("WHERE name = ?", (name,))
+        return records[0] if records else None
+
+    def list(self):
+        """Return every record, most recently used first"""
+        return self._select("ORDER BY last_access DESC")
+
+    def _select(self, clause, params=()):
+        with self.lock:
+            cursor = self.conn.execute(f"SELECT * FROM collections {clause}", params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def plan_eviction(self, max_bytes=int(COLLECTION_MAX_MB * 1024 * 1024), max_count=COLLECTION_MAX_COUNT,
+                      ttl_seconds=COLLECTION_TTL_DAYS * 86400, protect=(), active_seconds=COLLECTION_ACTIVE_MINUTES * 60):
+        """Return the names to evict: expired collections, then the least recently used until within budget.
+
+        Pinned collections, collections used within active_seconds and the names in protect are
+        never chosen, though they count towards the budget.
+        """
+        now = time.time()
+        records = sorted(self.list(), key=lambda record: record["last_access"])
+        total_bytes = sum(record["bytes"] for record in records)
+        total_count = len(records)
+
+        evict = []
+        for record in records:
+            if record["pinned"] or record["name"] in protect or now - record["last_access"] < active_seconds:
+                continue
+            expired = ttl_seconds and now - record["last_access"] > ttl_seconds
+            over_bytes = max_bytes and total_bytes > max_bytes
+            over_count = max_count and total_count > max_count
+            if not (expired or over_bytes or over_count):
+                continue
+            evict.append(record["name"])
+            total_bytes -= record["bytes"]
+            total_count -= 1
+        return evict
+
+    def totals(self):
+        """Return the number of collections, chunks and bytes recorded"""
+        with self.lock:
+            count, chunks, size_bytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0), COALESCE(SUM(bytes), 0) FROM collections"
+            ).fetchone()
+        return {"collections": count, "chunks": chunks, "bytes": size_bytes}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# Process-wide registry shared by every session
+def get_collection_registry():
+    """Return the shared collection registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CollectionRegistry()
+    return _registry
+
+def _format_age(seconds):
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.0f}{unit}"
+    return f"{seconds:.0f}s"
+
+def main(argv=None):
+    """Inspect and prune stored collections from the command line"""
+    parser = argparse.ArgumentParser(prog="python -m services.collection_registry", description=main.__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show every collection, most recently used first")
+    prune = commands.add_parser("prune", help="evict collections beyond the configured budgets")
+    prune.add_argument("--dry-run", action="store_true", help="only show what would be evicted")
+    prune.add_argument("--max-mb", type=float, default=COLLECTION_MAX_MB)
+    prune.add_argument("--max-count", type=int, default=COLLECTION_MAX_COUNT)
+    prune.add_argument("--ttl-days", type=float, default=COLLECTION_TTL_DAYS)
+    for command, help_text in (("delete", "delete collections"), ("pin", "never evict collections"), ("unpin", "allow evicting collections")):
+        subcommand = commands.add_parser(command, help=help_text)
+        subcommand.add_argument("names", nargs="+")
+    commands.add_parser("compact", help="reclaim space left by deleted chunks")
+    commands.add_parser("reindex-global", help="rebuild the cross-collection index from every collection")
+    args = parser.parse_args(argv)
+
+    # Imported here so the registry itself stays usable without the vector store dependencies
+    from services import vector_db
+
+    # Run as a script this module is loaded twice; share the instance vector_db uses
+    registry = vector_db.get_collection_registry()
+    vector_db.discover_collections()
+
+    if args.command == "list":
+        now = time.time()
+        print(f"{'NAME':<40} {'BACKEND':<7} {'CHUNKS':>7} {'MB':>8} {'IDLE':>5}  PIN  SOURCE")
+        for record in registry.list():
+            print(
+                f"{record['name']:<40} {record['backend']:<7} {record['chunks']:>7} "
+                f"{record['bytes'] / 1024 / 1024:>8.1f} {_format_age(now - record['last_access']):>5}  "
+                f"{'yes' if record['pinned'] else '   '}  {record['source'] or ''}"
+            )
+        totals = registry.totals()
+        print(f"{totals['collections']} collections, {totals['chunks']} chunks, {totals['bytes'] / 1024 / 1024:.1f} MB")
+    elif args.command == "prune":
+        names = registry.plan_eviction(int(args.max_mb * 1024 * 1024), args.max_count, args.ttl_days * 86400)
+        for name in names:
+            print(f"{'would evict' if args.dry_run else 'evicting'} {name}")
+            if not args.dry_run:
+                vector_db.delete_collection(name)
+        if not args.dry_run and names:
+            vector_db.compact_collections([])
+    elif args.command == "delete":
+        for name in args.names:
+            vector_db.delete_collection(name)
+            print(f"deleted {name}")
+    elif args.command in ("pin", "unpin"):
+        for name in args.names:
+            if not registry.set_pinned(name, args.command == "pin"):
+                print(f"unknown collection {name}", file=sys.stderr)
+    elif args.command == "compact":
+        vector_db.compact_collections()
+    elif args.command == "reindex-global":
+        vector_db.rebuild_global_index()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# services/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.sqlite_lru import SQL_BATCH, stored_bytes, replace_rows, evict_lru
+
+# Location and budgets of the persistent embedding cache
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "500"))
+EMBED_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", "20000"))
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") != "0"
+
+class EmbeddingCache:
+    """Embeddings keyed by model and text hash, in an LRU memory tier over a float16 SQLite store"""
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_bytes=int(EMBED_CACHE_MAX_MB * 1024 * 1024), memory_entries=EMBED_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self.conn.commit()
+        self.total_bytes = stored_bytes(self.conn, "embeddings")
+
+    @staticmethod
+    def make_key(model_id, text):
+        """Hash the model id and the text into a cache key"""
+        return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        # Caller holds the lock
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return a dict of the cached float32 vectors for the given keys"""
+        found = {}
+        with self.lock:
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    found[key] = vector
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            now = time.time()
+            for i in range(0, len(missing), SQL_BATCH):
+                batch = missing[i:i + SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                )
+            self.conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def set_many(self, items):
+        """Store (key, vector) pairs and evict least recently used vectors beyond the disk budget"""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for key, vector in items:
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                blob = vector.astype(np.float16).tobytes()
+                rows.append((key, blob, len(blob), now))
+            self.total_bytes += replace_rows(self.conn, "embeddings", "vector", rows)
+            if self.total_bytes > self.max_bytes:
+                self.total_bytes = evict_lru(self.conn, "embeddings", self.max_bytes)
+            self.conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "memory_entries": len(self.memory),
+                "bytes": self.total_bytes
+            }
+
+class CachedEmbeddingFunction:
+    """Wrap an embedding function so each distinct text is only embedded once per model"""
+
+    def __init__(self, embedding_function, cache, model_id=None):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.model_id = model_id or get_model_id(embedding_function)
+
+    def __call__(self, input):
+        keys = [self.cache.make_key(self.model_id, text) for text in input]
+        found = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times in the input
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self.cache.set_many(computed)
+            found.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in computed)
+
+        return [found[key] for key in keys]
+
+# Identify the model behind an embedding function so vectors of different models never mix
+def get_model_id(embedding_function):
+    """Return a string naming the embedding model"""
+    model_name = getattr(embedding_function, "MODEL_NAME", None) or getattr(embedding_function, "model_name", None)
+    if model_name is None and callable(getattr(embedding_function, "name", None)):
+        try:
+            model_name = embedding_function.name()
+        except Exception:
+            model_name = None
+    return f"{type(embedding_function).__name__}:{model_name or 'default'}"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Process-wide cache shared by every collection
+def get_embedding_cache():
+    """Return the shared embedding cache, or None when caching is disabled"""
+    global _cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
@@ -0,0 +1,88 @@
+# services/embedding_workers.py
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+# Number of embedding workers; 1 embeds on the calling thread
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# "process" gives each worker its own interpreter and model, "thread" shares one model
+# (ONNX Runtime releases the GIL while it runs, so threads can overlap too)
+EMBED_WORKER_BACKEND = os.getenv("EMBED_WORKER_BACKEND", "process")
+
+# Texts sent to a worker at a time
+EMBED_WORKER_BATCH_SIZE = int(os.getenv("EMBED_WORKER_BATCH_SIZE", "64"))
+
+def _load_model():
+    # Imported here so spawned workers only pay for what they use
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+# Model owned by a worker process, loaded once by the pool initializer
+_worker_model = None
+
+def _init_worker():
+    global _worker_model
+    _worker_model = _load_model()
+
+def _embed_in_worker(texts):
+    return np.asarray(_worker_model(texts), dtype=np.float32)
+
+class ParallelEmbeddingFunction:
+    """Embedding function that shards its input across a pool of workers and keeps the input order"""
+
+    def __init__(self, workers=EMBED_WORKERS, backend=EMBED_WORKER_BACKEND, batch_size=EMBED_WORKER_BATCH_SIZE):
+        self.workers = workers
+        self.backend = backend
+        self.batch_size = batch_size
+        if backend == "process":
+            # Spawn rather than fork: forking a process that already runs ONNX Runtime threads can deadlock
+            self.model = None
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        elif backend == "thread":
+            self.model = _load_model()
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+        else:
+            raise ValueError(f"Unknown embedding worker backend: {backend}")
+
+    def _embed_batch(self, texts):
+        return np.asarray(self.model(texts), dtype=np.float32)
+
+    def _worker(self):
+        return _embed_in_worker if self.backend == "process" else self._embed_batch
+
+    def __call__(self, input):
+        input = list(input)
+        batches = [input[i:i + self.batch_size] for i in range(0, len(input), self.batch_size)]
+        # map yields results in submission order, so vectors line up with the input
+        return [vector for batch in self.executor.map(self._worker(), batches) for vector in batch]
+
+    def warm_up(self):
+        """Start every worker and load its model before the first real batch"""
+        list(self.executor.map(self._worker(), [["warm up"]] * self.workers))
+
+    def shutdown(self):
+        """Stop the workers"""
+        self.executor.shutdown(wait=True)
+
+_parallel_function = None
+_parallel_lock = threading.Lock()
+
+# Process-wide worker pool, created on first use
+def get_parallel_embedding_function():
+    """Return the shared parallel embedding function, or None when EMBED_WORKERS is 1"""
+    global _parallel_function
+    if EMBED_WORKERS <= 1:
+        return None
+    if _parallel_function is None:
+        with _parallel_lock:
+            if _parallel_function is None:
+                _parallel_function = ParallelEmbeddingFunction()
+    return _parallel_function
@@ -0,0 +1,60 @@
+# services/global_index.py
+import os
+
+# One extra collection holds the chunks of every source so a question can span all of them
+GLOBAL_INDEX_ENABLED = os.getenv("GLOBAL_INDEX_ENABLED", "1") != "0"
+GLOBAL_COLLECTION_NAME = os.getenv("GLOBAL_COLLECTION_NAME", "global_index")
+
+# Two collections can hold the same source, and so the same chunk ids; rows are keyed by both
+def global_chunk_id(collection_name, chunk_id):
+    """Return the id of a collection's chunk in the global index"""
+    return f"{collection_name}:{chunk_id}"
+
+def split_global_chunk_id(global_id):
+    """Return the collection name and chunk id of a global index row"""
+    # Chunk ids never contain a colon, so split at the last one
+    collection_name, _, chunk_id = global_id.rpartition(":")
+    return collection_name, chunk_id
+
+# Build the metadata filter of a global search
+def build_global_where(types=None, source_keys=None):
+    """Return a where filter restricting results to content types and normalized sources, or None"""
+    where = {}
+    if types:
+        types = list(types)
+        where["type"] = types[0] if len(types) == 1 else {"$in": types}
+    if source_keys:
+        source_keys = list(source_keys)
+        where["source_key"] = source_keys[0] if len(source_keys) == 1 else {"$in": source_keys}
+    return where or None
+
+# Turn one query's results into one group per source
+def group_results_by_source(results, query_index=0):
+    """Group a Chroma-layout result by source, best matching source first.
+
+    Each group holds the source, its title and type, and the documents, metadatas and
+    distances of its chunks in retrieval order.
+    """
+    groups = {}
+    for document, metadata, distance in zip(
+        results["documents"][query_index],
+        results["metadatas"][query_index],
+        results["distances"][query_index]
+    ):
+        metadata = metadata or {}
+        key = metadata.get("source_key") or metadata.get("source")
+        group = groups.get(key)
+        if group is None:
+            group = {
+                "source": metadata.get("source"),
+                "title": metadata.get("title"),
+                "type": metadata.get("type"),
+                "documents": [],
+                "metadatas": [],
+                "distances": []
+            }
+            groups[key] = group
+        group["documents"].append(document)
+        group["metadatas"].append(metadata)
+        group["distances"].append(distance)
+    return sorted(groups.values(), key=lambda group: min(group["distances"]))
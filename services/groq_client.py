@@ -0,0 +1,102 @@
+# services/groq_client.py
+import os
+import time
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.rate_limiter import get_rate_limiter, parse_duration, backoff_delay, MAX_RETRIES
+
+# Configure Groq API
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+
+# Number of chunk summaries requested from Groq in parallel
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# Keep-alive pool sized for the summarization workers plus interactive chat requests
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", str(SUMMARY_CONCURRENCY + 2)))
+GROQ_TIMEOUT = (
+    float(os.getenv("GROQ_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+)
+
+# Status codes worth retrying after a pause
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+# Process-wide HTTP session so TLS connections are reused between calls
+def get_http_session():
+    """Return the shared keep-alive session used for all Groq requests"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_POOL_SIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+# Rough prompt size used to reserve tokens before the request is sent
+def estimate_request_tokens(data):
+    """Estimate the number of prompt tokens in a chat completion request"""
+    characters = sum(len(message.get("content", "")) for message in data.get("messages", []))
+    return characters // 4 + 1
+
+# Send a chat completion request through the shared rate limiter
+def post_chat_completion(data, api_key):
+    """POST a chat completion to Groq, retrying rate limits and server errors with backoff.
+
+    Returns the final response; callers decide how to handle non-200 status codes.
+    Requests with "stream": True return a response whose body is read incrementally.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    model = data.get("model", "")
+    limiter = get_rate_limiter()
+    session = get_http_session()
+    tokens = estimate_request_tokens(data)
+    stream = data.get("stream", False)
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire(api_key, model, tokens)
+        try:
+            response = session.post(GROQ_API_URL, headers=headers, data=json.dumps(data), timeout=GROQ_TIMEOUT, stream=stream)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        limiter.update_from_headers(api_key, model, response.headers)
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+            return response
+
+        # Release the pooled connection before retrying, then pause every caller
+        # sharing this key so retries don't turn into a storm
+        response.close()
+        delay = backoff_delay(attempt, parse_duration(response.headers.get("retry-after")))
+        limiter.block(api_key, model, delay)
+
+    return response
+
+# Read the server-sent events of a streamed chat completion
+def iter_stream_content(response):
+    """Yield the content deltas of a streamed chat completion response"""
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            choices = json.loads(payload).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
@@ -0,0 +1,217 @@
+# services/lexical_index.py
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+
+import numpy as np
+
+# Where lexical indexes are stored, one file per collection
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, numbers and identifiers such as "3.14", "gpt-4" or "module.function"
+_TOKEN_RE = re.compile(r"\w+(?:[.\-]\w+)*")
+
+def tokenize(text):
+    """Return the lowercase terms of a text; compound tokens are also indexed by their parts"""
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        if "." in token or "-" in token:
+            terms.extend(part for part in re.split(r"[.\-]", token) if part)
+    return terms
+
+class LexicalIndex:
+    """BM25 inverted index over the chunks of one collection.
+
+    Postings are stored as compressed-sparse-row arrays: for term t, documents
+    postings[offsets[t]:offsets[t + 1]] contain it tfs[...] times.
+    """
+
+    def __init__(self, collection_name, directory=LEXICAL_INDEX_PATH):
+        self.collection_name = collection_name
+        self.path = os.path.join(directory, f"{collection_name}.npz")
+        self.lock = threading.Lock()
+
+        self.vocabulary = {}
+        self.doc_ids = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        if os.path.exists(self.path):
+            self._load()
+        self.doc_positions = {doc_id: position for position, doc_id in enumerate(self.doc_ids)}
+        self._refresh_length_norms()
+
+    def _refresh_length_norms(self):
+        # BM25's per-document length normalization only changes when documents do
+        lengths = self.doc_lengths.astype(np.float32)
+        average = max(float(lengths.mean()), 1.0) if len(lengths) else 1.0
+        self.length_norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            self.vocabulary = {term: term_id for term_id, term in enumerate(data["vocabulary"].tolist())}
+            self.doc_ids = data["doc_ids"].tolist()
+            self.offsets = data["offsets"]
+            self.postings = _decode_gaps(data["posting_gaps"], self.offsets)
+            self.tfs = data["tfs"]
+            self.doc_lengths = data["doc_lengths"]
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_positions
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def update(self, added=(), removed=()):
+        """Add (doc_id, text) pairs and remove doc_ids, rebuilding the postings in one pass"""
+        added = [(doc_id, text) for doc_id, text in added]
+        removed = set(removed) | {doc_id for doc_id, _ in added}
+        if not added and not (removed & self.doc_positions.keys()):
+            return
+
+        with self.lock:
+            # Expand the current postings into (term, document, tf) triples, keeping live documents
+            term_ids = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+            keep_docs = np.array([doc_id not in removed for doc_id in self.doc_ids], dtype=bool)
+            new_positions = np.cumsum(keep_docs) - 1
+            live = keep_docs[self.postings] if len(self.postings) else np.zeros(0, dtype=bool)
+            triples = [(term_ids[live], new_positions[self.postings[live]], self.tfs[live])]
+
+            doc_ids = [doc_id for doc_id, keep in zip(self.doc_ids, keep_docs) if keep]
+            doc_lengths = [self.doc_lengths[keep_docs]]
+
+            # Count the terms of the new documents
+            new_terms, new_docs, new_tfs, new_lengths = [], [], [], []
+            for doc_id, text in added:
+                counts = Counter(tokenize(text))
+                new_terms.extend(counts.keys())
+                new_tfs.extend(counts.values())
+                new_docs.extend([len(doc_ids)] * len(counts))
+                new_lengths.append(sum(counts.values()))
+                doc_ids.append(doc_id)
+
+            vocabulary = dict(self.vocabulary)
+            for term in dict.fromkeys(new_terms):
+                if term not in vocabulary:
+                    vocabulary[term] = len(vocabulary)
+            triples.append((
+                np.asarray([vocabulary[term] for term in new_terms], dtype=np.int64),
+                np.asarray(new_docs, dtype=np.int64),
+                np.minimum(np.asarray(new_tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)
+            ))
+            doc_lengths.append(np.asarray(new_lengths, dtype=np.int32))
+
+            terms = np.concatenate([t for t, _, _ in triples])
+            docs = np.concatenate([d for _, d, _ in triples])
+            tfs = np.concatenate([f for _, _, f in triples])
+            order = np.lexsort((docs, terms))
+
+            self.vocabulary = vocabulary
+            self.doc_ids = doc_ids
+            self.doc_positions = {doc_id: position for position, doc_id in enumerate(doc_ids)}
+            self.postings = docs[order].astype(np.int32)
+            self.tfs = tfs[order]
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))]).astype(np.int64)
+            self.doc_lengths = np.concatenate(doc_lengths).astype(np.int32)
+            self._refresh_length_norms()
+
+    def persist(self, path=None):
+        """Write the index to disk atomically, to its own file unless path is given"""
+        path = path or self.path
+        with self.lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+            temporary_path = path + ".tmp.npz"
+            # Gaps between sorted document numbers are small and compress far better than the numbers
+            np.savez_compressed(
+                temporary_path,
+                vocabulary=np.array(vocabulary, dtype=str),
+                doc_ids=np.array(self.doc_ids, dtype=str),
+                offsets=self.offsets,
+                posting_gaps=_encode_gaps(self.postings, self.offsets),
+                tfs=self.tfs,
+                doc_lengths=self.doc_lengths
+            )
+            os.replace(temporary_path, path)
+
+    def search(self, query, n_results=10):
+        """Return up to n_results (doc_id, score) pairs ranked by BM25"""
+        with self.lock:
+            if not self.doc_ids:
+                return []
+            term_ids = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+            if not term_ids:
+                return []
+
+            doc_count = len(self.doc_ids)
+            scores = np.zeros(doc_count, dtype=np.float32)
+            for term_id in term_ids:
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                docs = self.postings[start:end]
+                tfs = self.tfs[start:end].astype(np.float32)
+                idf = np.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + self.length_norms[docs])
+
+            matched = np.flatnonzero(scores)
+            if len(matched) > n_results:
+                matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+            matched = matched[np.argsort(-scores[matched], kind="stable")]
+            return [(self.doc_ids[position], float(scores[position])) for position in matched]
+
+# Store each posting list as its first document number followed by the gaps between documents
+def _encode_gaps(postings, offsets):
+    gaps = np.diff(postings, prepend=0).astype(np.int32)
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    gaps[starts] = postings[starts]
+    return gaps
+
+def _decode_gaps(gaps, offsets):
+    totals = np.cumsum(gaps, dtype=np.int64)
+    lengths = np.diff(offsets)
+    starts = offsets[:-1]
+    # Running totals restart at the beginning of every posting list
+    before = np.where(starts > 0, totals[np.maximum(starts - 1, 0)] if len(totals) else 0, 0)
+    return (totals - np.repeat(before, lengths)).astype(np.int32)
+
+_lexical_indexes = {}
+_lexical_indexes_lock = threading.Lock()
+
+# Process-wide lexical index per collection
+def get_lexical_index(collection_name):
+    """Return the shared lexical index for a collection, loading it on first use"""
+    with _lexical_indexes_lock:
+        index = _lexical_indexes.get(collection_name)
+        if index is None:
+            index = LexicalIndex(collection_name)
+            _lexical_indexes[collection_name] = index
+        return index
+
+# Forget a collection's lexical index and delete its file
+def drop_lexical_index(collection_name):
+    """Remove the lexical index of a collection from memory and disk"""
+    with _lexical_indexes_lock:
+        index = _lexical_indexes.pop(collection_name, None)
+    path = index.path if index else os.path.join(LEXICAL_INDEX_PATH, f"{collection_name}.npz")
+    if os.path.exists(path):
+        os.remove(path)
+
+# Replace a collection's lexical index with one saved elsewhere
+def restore_lexical_index(collection_name, path):
+    """Install a persisted index file for a collection and return the loaded index"""
+    index_path = os.path.join(LEXICAL_INDEX_PATH, f"{collection_name}.npz")
+    os.makedirs(LEXICAL_INDEX_PATH, exist_ok=True)
+    temporary_path = index_path + ".tmp.npz"
+    shutil.copyfile(path, temporary_path)
+    os.replace(temporary_path, index_path)
+    with _lexical_indexes_lock:
+        index = LexicalIndex(collection_name)
+        _lexical_indexes[collection_name] = index
+    return index
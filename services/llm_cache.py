@@ -0,0 +1,102 @@
+# services/llm_cache.py
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+
+from services.sqlite_lru import stored_bytes, replace_rows, evict_lru
+
+# Location and size budget of the persistent completion cache
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache/completions.sqlite3")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+class CompletionCache:
+    """Content-addressed SQLite cache of LLM completions with LRU eviction by size"""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access)")
+        self.conn.commit()
+        self.total_bytes = stored_bytes(self.conn, "completions")
+
+    @staticmethod
+    def make_key(model, system_prompt, user_prompt, temperature, max_tokens=None):
+        """Hash everything that influences the completion into a cache key"""
+        payload = json.dumps([model, system_prompt, user_prompt, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def key_for_request(cls, data):
+        """Build the cache key for a chat completion request body"""
+        messages = {message["role"]: message["content"] for message in data.get("messages", [])}
+        return cls.make_key(
+            data.get("model"),
+            messages.get("system", ""),
+            messages.get("user", ""),
+            data.get("temperature"),
+            data.get("max_tokens")
+        )
+
+    def get(self, key):
+        """Return the cached completion for key, or None on a miss"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def set(self, key, value):
+        """Store a completion and evict least recently used entries beyond the size budget"""
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            self.total_bytes += replace_rows(self.conn, "completions", "value", [(key, value, size, time.time())])
+            if self.total_bytes > self.max_bytes:
+                self.total_bytes = evict_lru(self.conn, "completions", self.max_bytes)
+            self.conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": self.total_bytes
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Process-wide cache shared by the Streamlit app and the Flask backend
+def get_completion_cache():
+    """Return the shared completion cache, or None when caching is disabled"""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CompletionCache()
+    return _cache
@@ -1,26 +1,46 @@
 # services/llm_service.py
 import os
-import time
-import requests
-import json
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from services.vector_db import store_chunks_in_vector_db, query_vector_db, get_or_create_collection
-from prompts.prompt_templates import qa_prompt, chunk_prompt, get_final_prompt_by_type
-from utils.text_processing import split_into_chunks, format_conversation_history
+from services.llm_cache import get_completion_cache
+from services.groq_client import post_chat_completion, iter_stream_content, SUMMARY_CONCURRENCY
+from services.answer_cache import get_answer_cache
+from services.vector_db import (
+    store_chunks_in_vector_db, query_vector_db, hybrid_query_vector_db, global_query_vector_db, diversify_results,
+    embed_query, get_or_create_collection, get_vector_store, resolve_vector_store, HYBRID_RETRIEVAL
+)
+from services.global_index import GLOBAL_INDEX_ENABLED, GLOBAL_COLLECTION_NAME, group_results_by_source
+from prompts.prompt_templates import qa_prompt, chunk_prompt, section_merge_prompt, conversation_summary_prompt, get_final_prompt_by_type
+from utils.text_processing import split_into_chunk_spans, materialize_spans, assign_parent_spans, estimate_tokens
+from utils.conversation_memory import ConversationMemory
+from utils.context_packer import pack_context, pack_grouped_context
 
 # Configure Groq API
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Largest combined summary text sent to a single reduce call, leaving room in the
+# 8192-token context for the prompt and the 1000-token completion
+REDUCE_INPUT_TOKENS = int(os.getenv("REDUCE_INPUT_TOKENS", "5000"))
+
+# Chunk sizes in model tokens for summarization and for vector search
+SUMMARY_CHUNK_TOKENS = 1000
+VECTOR_CHUNK_TOKENS = 250
+VECTOR_CHUNK_OVERLAP_TOKENS = 25
+
+# Chunks retrieved per question before overlapping and duplicate ones are merged away
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+
+# Candidates fetched per kept chunk for diversity re-ranking; 1 turns re-ranking off
+MMR_FETCH_FACTOR = int(os.getenv("MMR_FETCH_FACTOR", "3"))
+
+# Prompt budget for a QA call, shared by the retrieved context, the summary and the
+# history; leaves room in the 8192-token context for the 1000-token answer
+QA_PROMPT_TOKENS = int(os.getenv("QA_PROMPT_TOKENS", "6500"))
 
 # Generate content using Groq API
 def generate_groq_content(content_text, prompt, model="llama3-70b-8192"):
     """Generate content using the Groq API"""
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     data = {
         "model": model,
         "messages": [
@@ -37,49 +57,140 @@ def generate_groq_content(content_text, prompt, model="llama3-70b-8192"):
         "max_tokens": 1000
     }
     
+    # Return instantly when the same request was answered before
+    cache = get_completion_cache()
+    cache_key = cache.key_for_request(data) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, data=json.dumps(data))
+        # Rate limits are retried with backoff inside the shared client
+        response = post_chat_completion(data, GROQ_API_KEY)
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        elif response.status_code == 429:  # Rate limit error
-            st.warning("Rate limit reached. Waiting before retrying...")
-            time.sleep(5)  # Wait 5 seconds before retrying
-            return generate_groq_content(content_text, prompt, model)  # Retry
+            content = response.json()["choices"][0]["message"]["content"]
+            if cache:
+                cache.set(cache_key, content)
+            return content
         else:
             return f"Error: {response.status_code}, {response.text}"
     except Exception as e:
         return f"Error making API call: {str(e)}"
 
+# Summarize many chunks concurrently while keeping their original order
+def summarize_chunks(chunks, prompt, model="llama3-8b-8192", max_workers=None, on_progress=None):
+    """Summarize chunks with a bounded thread pool and return summaries in chunk order"""
+    if not chunks:
+        return []
+    
+    max_workers = max(1, min(max_workers or SUMMARY_CONCURRENCY, len(chunks)))
+    summaries = [None] * len(chunks)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(generate_groq_content, chunk, prompt, model): i
+            for i, chunk in enumerate(chunks)
+        }
+        # Progress callbacks run on the calling thread so Streamlit widgets can be updated safely
+        for done, future in enumerate(as_completed(futures), start=1):
+            summaries[futures[future]] = future.result()
+            if on_progress:
+                on_progress(done, len(chunks))
+    
+    return summaries
+
+# Join section summaries into the text passed to a reduce call
+def combine_section_summaries(summaries):
+    """Combine section summaries with section markers"""
+    return "\n\n--- SECTION SUMMARY " + " ---\n\n--- SECTION SUMMARY ".join(summaries) + " ---\n\n"
+
+# Group consecutive summaries into batches that fit the reduce budget
+def group_by_token_budget(summaries, max_tokens=REDUCE_INPUT_TOKENS):
+    """Split summaries into ordered batches whose combined size stays within max_tokens"""
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    
+    for summary in summaries:
+        summary_tokens = estimate_tokens(summary) + 10  # Section marker overhead
+        if current_batch and current_tokens + summary_tokens > max_tokens:
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(summary)
+        current_tokens += summary_tokens
+    
+    if current_batch:
+        batches.append(current_batch)
+    
+    # Always make progress, even if every summary is close to the budget on its own
+    if len(batches) == len(summaries) and len(summaries) > 1:
+        batches = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    
+    return batches
+
+# Reduce section summaries level by level until they fit a single final call
+def reduce_summaries(summaries, max_tokens=REDUCE_INPUT_TOKENS, on_level=None, on_progress=None):
+    """Merge summaries in parallel batches until their combined text fits max_tokens.
+
+    Returns the remaining summaries and the number of reduce levels that were needed.
+    """
+    depth = 0
+    while len(summaries) > 1 and estimate_tokens(combine_section_summaries(summaries)) > max_tokens:
+        batches = group_by_token_budget(summaries, max_tokens)
+        depth += 1
+        if on_level:
+            on_level(depth, len(summaries), len(batches))
+        summaries = summarize_chunks(
+            [combine_section_summaries(batch) for batch in batches],
+            section_merge_prompt,
+            "llama3-8b-8192",
+            on_progress=on_progress
+        )
+    
+    return summaries, depth
+
 # Process content in chunks and add to vector database
 def process_large_content(content, content_type, source_url, collection_name):
     """Process large content by chunking, summarizing, and storing in vector DB"""
     with st.status("Processing content in chunks...") as status:        
-        # Split content into chunks for summarization and for vector DB
-        summary_chunks = split_into_chunks(content, max_chunk_size=4000)
-        vector_chunks = split_into_chunks(content, max_chunk_size=1000, overlap=100)
+        # Split content once into spans for summarization and for vector DB
+        summary_spans, vector_spans = split_into_chunk_spans(content, [
+            (SUMMARY_CHUNK_TOKENS, 0),
+            (VECTOR_CHUNK_TOKENS, VECTOR_CHUNK_OVERLAP_TOKENS)
+        ])
+        summary_chunks = materialize_spans(content, summary_spans)
         
-        status.update(label=f"Split into {len(summary_chunks)} summary chunks and {len(vector_chunks)} vector chunks")
+        status.update(label=f"Split into {len(summary_spans)} summary chunks and {len(vector_spans)} vector chunks")
         
-        # Process each chunk for summary
-        chunk_summaries = []
+        # Summarize chunks in parallel, updating the widgets as each one finishes
         progress_bar = st.progress(0)
         
-        for i, chunk in enumerate(summary_chunks):
-            status.update(label=f"Processing summary chunk {i+1}/{len(summary_chunks)}...")
-            chunk_summary = generate_groq_content(chunk, chunk_prompt, "llama3-8b-8192")  # Using smaller model for chunks
-            chunk_summaries.append(chunk_summary)
-            progress_bar.progress((i + 1) / len(summary_chunks))
-            # Add a delay to respect rate limits
-            time.sleep(1)
+        def report_progress(done, total):
+            status.update(label=f"Summarized chunk {done}/{total}...")
+            progress_bar.progress(done / total)
         
-        # Combine chunk summaries
-        combined_summaries = "\n\n--- SECTION SUMMARY " + " ---\n\n--- SECTION SUMMARY ".join(chunk_summaries) + " ---\n\n"
+        # Unchanged chunks of a previously processed page are answered from the completion cache
+        cache = get_completion_cache()
+        cache_hits_before = cache.hits if cache else 0
+        chunk_summaries = summarize_chunks(summary_chunks, chunk_prompt, "llama3-8b-8192", on_progress=report_progress)  # Using smaller model for chunks
+        if cache:
+            status.write(f"Section summaries: {cache.hits - cache_hits_before} of {len(summary_chunks)} reused from cache")
         
-        # Generate final summary based on content type
+        # Generate final summary based on content type, merging summaries in levels when they don't fit one call
         final_prompt = get_final_prompt_by_type(content_type)
-            
+        
+        def report_level(depth, summary_count, batch_count):
+            status.write(f"Reduce level {depth}: {summary_count} summaries merged in {batch_count} batches (fan-out ~{-(-summary_count // batch_count)})")
+            status.update(label=f"Merging section summaries (level {depth})...")
+            progress_bar.progress(0)
+        
+        section_summaries, depth = reduce_summaries(chunk_summaries, on_level=report_level, on_progress=report_progress)
+        
         status.update(label="Generating final summary...")
-        final_summary = generate_groq_content(combined_summaries, final_prompt, "llama3-70b-8192")
+        status.write(f"Final summary from {len(chunk_summaries)} sections, reduce depth {depth}")
+        final_summary = generate_groq_content(combine_section_summaries(section_summaries), final_prompt, "llama3-70b-8192")
         
         # Store chunks in vector database
         status.update(label="Storing content in vector database...")
@@ -89,29 +200,119 @@ def process_large_content(content, content_type, source_url, collection_name):
             "type": content_type
         }
         
+        # Keep each vector chunk's position and the summary chunk it belongs to
+        parent_chunks = assign_parent_spans(vector_spans, summary_spans)
+        chunk_metadatas = [
+            {"start": start, "end": end, "parent_chunk": parent}
+            for (start, end), parent in zip(vector_spans, parent_chunks)
+        ]
+        
         # Store in vector database
-        vector_db = store_chunks_in_vector_db(vector_chunks, collection_name, metadata)
+        vector_chunks = materialize_spans(content, vector_spans)
+        vector_db, ingest_stats = store_chunks_in_vector_db(vector_chunks, collection_name, metadata, chunk_metadatas, summary=final_summary)
+        status.write(f"Vector chunks: {ingest_stats['added']} embedded, {ingest_stats['unchanged']} unchanged, {ingest_stats['deleted']} removed")
+        status.write(
+            f"Embedding took {ingest_stats['embed_seconds']:.1f}s, writing took {ingest_stats['write_seconds']:.1f}s, "
+            f"keyword indexing took {ingest_stats['lexical_seconds']:.1f}s"
+        )
         st.session_state.vector_db = vector_db
         
         status.update(label="Processing complete!", state="complete")
         
         return final_summary
 
+# Fold older conversation turns into the rolling summary
+def summarize_conversation(text):
+    """Return an updated conversation summary using the smaller, faster model"""
+    return generate_groq_content(text, conversation_summary_prompt, model="llama3-8b-8192")
+
+# Conversation memory of the current Streamlit session
+def get_conversation_memory():
+    """Return the session's conversation memory, creating it on first use"""
+    if st.session_state.get("conversation_memory") is None:
+        st.session_state.conversation_memory = ConversationMemory(summarize_conversation)
+    return st.session_state.conversation_memory
+
+# Stream a chat completion token by token
+def stream_groq_content(data):
+    """Yield the answer text incrementally, or a single error message if the call fails"""
+    try:
+        response = post_chat_completion(dict(data, stream=True), GROQ_API_KEY)
+        if response.status_code != 200:
+            yield f"Error: {response.status_code}, {response.text}"
+            return
+        yield from iter_stream_content(response)
+    except Exception as e:
+        yield f"Error making API call: {str(e)}"
+
+# Pass a token stream through and hand the complete text to a callback at the end
+def _stream_and_remember(tokens, on_complete):
+    parts = []
+    for token in tokens:
+        parts.append(token)
+        yield token
+    on_complete("".join(parts))
+
 # Answer questions based on extracted content with vector database search
-def answer_question(question):
-    """Generate an answer to a question using vector search and LLM"""
-    # Get conversation history (excluding the current question and initial system message)
-    conversation_history = st.session_state.chat_history[1:] if len(st.session_state.chat_history) > 1 else []
+def answer_question(question, stream=False):
+    """Generate an answer to a question using vector search and LLM.
+
+    With stream=True a generator of text fragments is returned instead of the full answer.
+    """
+    # Recent turns verbatim plus a summary of older ones, within the history token budget
+    memory = get_conversation_memory()
+    formatted_history = memory.format()
+    
+    # Questions can be asked of every processed source at once
+    search_all = st.session_state.search_all_sources and GLOBAL_INDEX_ENABLED
     
-    # Format the conversation history
-    formatted_history = format_conversation_history(conversation_history)
+    # The collection may have been evicted since it was processed
+    if st.session_state.vector_db is not None:
+        st.session_state.vector_db = resolve_vector_store(st.session_state.vector_db)
+        if st.session_state.vector_db is None and not search_all:
+            answer = "Error: The stored content for this URL was removed to free space. Process the URL again to ask questions about it."
+            return iter([answer]) if stream else answer
+    
+    # Earlier turns can change what a question means, so only standalone questions are cached
+    answer_cache = get_answer_cache() if st.session_state.vector_db and not len(memory) and not search_all else None
     
     # Query vector database for relevant chunks
     with st.spinner("Searching relevant content..."):
-        if st.session_state.vector_db:
-            results = query_vector_db(question, st.session_state.vector_db, n_results=3)
-            relevant_chunks = results['documents'][0]
-            relevant_chunks_text = "\n\n---\n\n".join(relevant_chunks)
+        if st.session_state.vector_db or search_all:
+            question_embedding = embed_query(question)
+            if answer_cache:
+                cached_answer = answer_cache.lookup(st.session_state.collection_name, question_embedding)
+                if cached_answer is not None:
+                    return iter([cached_answer]) if stream else cached_answer
+            
+            # Over-fetch, then keep a varied subset so neighbouring chunks don't crowd out other passages
+            fetch_count = RETRIEVAL_CANDIDATES * max(MMR_FETCH_FACTOR, 1)
+            if search_all:
+                store = get_vector_store(GLOBAL_COLLECTION_NAME)
+                results = global_query_vector_db(
+                    question, n_results=fetch_count, types=st.session_state.search_source_types or None,
+                    query_embedding=question_embedding
+                )
+            else:
+                store = st.session_state.vector_db
+                retrieve = hybrid_query_vector_db if HYBRID_RETRIEVAL else query_vector_db
+                results = retrieve(question, store, n_results=fetch_count, query_embedding=question_embedding)
+            if MMR_FETCH_FACTOR > 1:
+                results = diversify_results(store, results, [question_embedding], RETRIEVAL_CANDIDATES, hybrid=HYBRID_RETRIEVAL and not search_all)
+            
+            # Whatever the summary, history and question leave of the prompt budget goes to context
+            context_budget = QA_PROMPT_TOKENS - estimate_tokens(
+                qa_prompt + st.session_state.summary + formatted_history + question
+            )
+            if search_all:
+                relevant_chunks_text = pack_grouped_context(group_results_by_source(results), max_tokens=max(context_budget, 0))
+            else:
+                relevant_chunks_text = pack_context(
+                    results['documents'][0],
+                    results['metadatas'][0],
+                    results['distances'][0],
+                    max_tokens=max(context_budget, 0)
+                )
         else:
             # Fallback if vector DB is not available
             relevant_chunks_text = "Vector database not available. Using summary only."
@@ -125,11 +326,6 @@ def answer_question(question):
     )
     
     # Generate answer using Groq API with memory-aware prompt
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     data = {
         "model": "llama3-70b-8192",
         "messages": [
@@ -146,10 +342,20 @@ def answer_question(question):
         "max_tokens": 1000
     }
     
+    # Remember successful answers for near-duplicate questions
+    def remember(answer):
+        if answer_cache and not answer.startswith("Error"):
+            answer_cache.store(st.session_state.collection_name, question, question_embedding, answer)
+    
+    if stream:
+        return _stream_and_remember(stream_groq_content(data), remember)
+    
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, data=json.dumps(data))
+        response = post_chat_completion(data, GROQ_API_KEY)
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
+            answer = response.json()["choices"][0]["message"]["content"]
+            remember(answer)
+            return answer
         else:
             return f"Error: {response.status_code}, {response.text}"
     except Exception as e:
@@ -0,0 +1,155 @@
+# services/rate_limiter.py
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+
+# Default client-side limits, corrected at runtime from Groq's x-ratelimit-* headers
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "30000"))
+
+# Backoff settings for retried calls
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously up to its capacity"""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.level = min(self.capacity, self.level + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        """Take amount from the bucket and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Never ask for more than a full bucket, otherwise a large request would wait forever
+            amount = min(float(amount), self.capacity)
+            self.level -= amount
+            if self.level >= 0:
+                return 0.0
+            return -self.level / self.refill_per_second
+
+    def sync(self, limit=None, remaining=None):
+        """Align the bucket with limits reported by the server"""
+        with self.lock:
+            self._refill(time.monotonic())
+            if limit:
+                self.capacity = float(limit)
+                self.refill_per_second = self.capacity / 60.0
+            if remaining is not None:
+                self.level = min(self.level, float(remaining))
+
+class RateLimiter:
+    """Shared limiter tracking requests and tokens per minute for each (API key, model) pair"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.buckets = {}
+        self.blocked_until = {}
+        self.lock = threading.Lock()
+
+    def _key(self, api_key, model):
+        # Only keep a digest of the key in memory
+        key_digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        return key_digest, model
+
+    def _get_buckets(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = (
+                    TokenBucket(self.requests_per_minute, self.requests_per_minute / 60.0),
+                    TokenBucket(self.tokens_per_minute, self.tokens_per_minute / 60.0),
+                )
+            return self.buckets[key]
+
+    def acquire(self, api_key, model, tokens):
+        """Block until one request using roughly `tokens` tokens may be sent"""
+        key = self._key(api_key, model)
+        request_bucket, token_bucket = self._get_buckets(key)
+
+        # Respect any server-imposed pause first
+        with self.lock:
+            pause = self.blocked_until.get(key, 0) - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+        wait = max(request_bucket.reserve(1), token_bucket.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+
+    def block(self, api_key, model, seconds):
+        """Pause every caller of this key and model for the given number of seconds"""
+        key = self._key(api_key, model)
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.blocked_until[key] = max(self.blocked_until.get(key, 0), until)
+
+    def update_from_headers(self, api_key, model, headers):
+        """Update limits from Groq's x-ratelimit-* response headers"""
+        key = self._key(api_key, model)
+        _, token_bucket = self._get_buckets(key)
+
+        # Token headers describe the per-minute token budget
+        token_limit = _parse_int(headers.get("x-ratelimit-limit-tokens"))
+        tokens_remaining = _parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        token_bucket.sync(token_limit, tokens_remaining)
+
+        # Request headers describe the daily budget, so only pause when it is exhausted
+        requests_remaining = _parse_int(headers.get("x-ratelimit-remaining-requests"))
+        if requests_remaining == 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self.block(api_key, model, reset)
+
+# Parse an integer header value, returning None when absent or malformed
+def _parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+# Parse durations such as "7.66s", "2m59.56s", "120ms" or a plain number of seconds
+def parse_duration(value):
+    """Convert a rate limit duration header into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+# Compute how long to wait before retry number `attempt` (starting at 0)
+def backoff_delay(attempt, retry_after=None):
+    """Use the server's Retry-After when given, otherwise full-jitter exponential backoff"""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS)
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+# Process-wide limiter shared by every Groq call
+_rate_limiter = RateLimiter()
+
+def get_rate_limiter():
+    """Return the shared rate limiter"""
+    return _rate_limiter
@@ -0,0 +1,229 @@
+# services/snapshots.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+
+import numpy as np
+
+from services import vector_db
+from services.answer_cache import get_answer_cache
+from services.lexical_index import restore_lexical_index
+from services.collection_registry import get_collection_registry
+
+# Default location of exported snapshots, one directory per collection
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "./snapshots")
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Per-chunk integer metadata stored as columns of positions.npy; -1 marks a missing value
+_POSITION_KEYS = ("start", "end", "parent_chunk")
+
+# Keys derived from other fields on import, so they are not stored
+_DERIVED_KEYS = ("chunk_hash",)
+
+def _split_metadata(metadatas):
+    """Split chunk metadata into values shared by every chunk, position columns and the rest"""
+    keys = {key for metadata in metadatas for key in metadata}
+    shared = {}
+    for key in keys - set(_POSITION_KEYS) - set(_DERIVED_KEYS):
+        values = [metadata.get(key) for metadata in metadatas]
+        if all(value == values[0] for value in values):
+            shared[key] = values[0]
+    varying = sorted(keys - set(shared) - set(_POSITION_KEYS) - set(_DERIVED_KEYS))
+    positions = np.asarray(
+        [[metadata.get(key, -1) for key in _POSITION_KEYS] for metadata in metadatas], dtype=np.int64
+    ).reshape(len(metadatas), len(_POSITION_KEYS))
+    extra = {key: [metadata.get(key) for metadata in metadatas] for key in varying}
+    return shared, positions, extra
+
+# Write a collection and its summary to a directory of contiguous arrays
+def export_snapshot(collection_name, directory=None, summary=None):
+    """Export a collection to directory (default SNAPSHOT_PATH/<collection_name>) and return the path.
+
+    The snapshot holds a manifest.json (source, title, summary, embedding model and shared
+    metadata), the embeddings, ids, chunk positions and the offsets of each chunk in one UTF-8
+    text blob as .npy arrays, and the collection's keyword index. In-memory collections are
+    exported too; unknown names raise ValueError.
+    """
+    directory = directory or os.path.join(SNAPSHOT_PATH, collection_name)
+    store, record = vector_db.find_collection(collection_name)
+    if store is None:
+        raise ValueError(f"Unknown collection: {collection_name}")
+
+    ids = store.get_ids()
+    documents, metadatas = [], []
+    batch_size = store.get_max_batch_size()
+    for i in range(0, len(ids), batch_size):
+        records = store.get(ids[i:i + batch_size])
+        found = dict(zip(records["ids"], zip(records["documents"], records["metadatas"])))
+        for chunk_id in ids[i:i + batch_size]:
+            document, metadata = found[chunk_id]
+            documents.append(document)
+            metadatas.append(metadata or {})
+    embeddings = np.ascontiguousarray(store.get_embeddings(ids), dtype=np.float32) if ids else np.zeros((0, 0), dtype=np.float32)
+
+    # Store chunks in reading order so a restored collection reads like the original
+    order = sorted(range(len(ids)), key=lambda i: (metadatas[i].get("start") is None, metadatas[i].get("start") or 0))
+    ids = [ids[i] for i in order]
+    documents = [documents[i] for i in order]
+    metadatas = [metadatas[i] for i in order]
+    embeddings = embeddings[order] if len(order) else embeddings
+
+    shared, positions, extra = _split_metadata(metadatas)
+    encoded = [document.encode("utf-8") for document in documents]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=text_offsets[1:])
+
+    # Write into a temporary directory and swap it in, so a failed export leaves no half snapshot
+    temporary = directory.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    np.save(os.path.join(temporary, "embeddings.npy"), embeddings)
+    np.save(os.path.join(temporary, "ids.npy"), np.array(ids, dtype=str))
+    np.save(os.path.join(temporary, "positions.npy"), positions)
+    np.save(os.path.join(temporary, "text_offsets.npy"), text_offsets)
+    with open(os.path.join(temporary, "texts.bin"), "wb") as handle:
+        handle.write(b"".join(encoded))
+    if extra:
+        with open(os.path.join(temporary, "chunk_metadata.json"), "w", encoding="utf-8") as handle:
+            json.dump(extra, handle, ensure_ascii=False)
+    vector_db.get_lexical_index(collection_name).persist(os.path.join(temporary, "lexical.npz"))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "collection_name": collection_name,
+        "source": record.get("source") or shared.get("source"),
+        "title": record.get("title") or shared.get("title"),
+        "type": record.get("type") or shared.get("type"),
+        "summary": summary if summary is not None else record.get("summary"),
+        "embedding_model": vector_db.get_embedding_model_id(),
+        "chunks": len(ids),
+        "dimensions": int(embeddings.shape[1]) if len(ids) else 0,
+        "metadata": shared,
+        "position_keys": list(_POSITION_KEYS),
+        "created": time.time()
+    }
+    with open(os.path.join(temporary, "manifest.json"), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temporary, directory)
+    return directory
+
+# Load a snapshot into the vector store without embedding anything
+def import_snapshot(directory, collection_name=None):
+    """Restore a snapshot into the configured vector store.
+
+    Arrays are memory-mapped and written to the store in its largest batches. Returns the
+    vector store, the manifest (including the summary) and a dict of timings in seconds.
+    """
+    start = time.perf_counter()
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {manifest.get('format_version')}")
+    model_id = vector_db.get_embedding_model_id()
+    if manifest["embedding_model"] != model_id:
+        raise ValueError(f"Snapshot was embedded with {manifest['embedding_model']}, but this app embeds with {model_id}")
+    collection_name = collection_name or manifest["collection_name"]
+
+    embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+    ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+    positions = np.load(os.path.join(directory, "positions.npy"), mmap_mode="r")
+    text_offsets = np.load(os.path.join(directory, "text_offsets.npy"), mmap_mode="r")
+    texts = np.memmap(os.path.join(directory, "texts.bin"), dtype=np.uint8, mode="r") if text_offsets[-1] else b""
+    extra = {}
+    extra_path = os.path.join(directory, "chunk_metadata.json")
+    if os.path.exists(extra_path):
+        with open(extra_path, encoding="utf-8") as handle:
+            extra = json.load(handle)
+    position_keys = manifest["position_keys"]
+
+    store = vector_db.get_vector_store(collection_name)
+    snapshot_ids = ids.tolist()
+    stale_ids = list(set(store.get_ids()) - set(snapshot_ids))
+    if stale_ids:
+        store.delete(stale_ids)
+
+    write_start = time.perf_counter()
+    batch_size = store.get_max_batch_size()
+    for i in range(0, len(snapshot_ids), batch_size):
+        end = min(i + batch_size, len(snapshot_ids))
+        offsets = text_offsets[i:end + 1].tolist()
+        blob = bytes(texts[offsets[0]:offsets[-1]])
+        documents = [
+            blob[offsets[j] - offsets[0]:offsets[j + 1] - offsets[0]].decode("utf-8")
+            for j in range(end - i)
+        ]
+        metadatas = []
+        for j, (document, row) in enumerate(zip(documents, positions[i:end].tolist())):
+            metadata = dict(manifest["metadata"])
+            metadata.update((key, value) for key, value in zip(position_keys, row) if value >= 0)
+            metadata.update((key, values[i + j]) for key, values in extra.items() if values[i + j] is not None)
+            metadata["chunk_hash"] = vector_db.chunk_hash(document)
+            metadatas.append(metadata)
+        store.upsert(snapshot_ids[i:end], np.asarray(embeddings[i:end]), documents, metadatas)
+    store.persist()
+    write_seconds = time.perf_counter() - write_start
+
+    # The keyword index travels with the snapshot instead of being rebuilt from the text
+    lexical_start = time.perf_counter()
+    restore_lexical_index(collection_name, os.path.join(directory, "lexical.npz"))
+    lexical_seconds = time.perf_counter() - lexical_start
+
+    get_answer_cache().invalidate(collection_name)
+    get_collection_registry().record(
+        collection_name, vector_db.VECTOR_STORE_BACKEND, store.count(), store.disk_bytes() or 0,
+        source=manifest.get("source"), title=manifest.get("title"), content_type=manifest.get("type"),
+        summary=manifest.get("summary")
+    )
+    global_start = time.perf_counter()
+    vector_db.sync_global_index(collection_name, store)
+    global_seconds = time.perf_counter() - global_start
+
+    stats = {
+        "chunks": len(snapshot_ids),
+        "write_seconds": write_seconds,
+        "lexical_seconds": lexical_seconds,
+        "global_seconds": global_seconds,
+        "total_seconds": time.perf_counter() - start
+    }
+    return store, manifest, stats
+
+def main(argv=None):
+    """Export processed documents to snapshots and restore them"""
+    parser = argparse.ArgumentParser(prog="python -m services.snapshots", description=main.__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a collection to a snapshot directory")
+    export.add_argument("collection")
+    export.add_argument("directory", nargs="?", help=f"defaults to {SNAPSHOT_PATH}/<collection>")
+    restore = commands.add_parser("import", help="load a snapshot directory into the vector store")
+    restore.add_argument("directory")
+    restore.add_argument("--name", help="collection to restore into (defaults to the exported name)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        # Collections stored before the registry existed are only exported once registered
+        vector_db.discover_collections()
+        try:
+            print(export_snapshot(args.collection, args.directory))
+        except ValueError as e:
+            print(f"Error exporting snapshot: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        try:
+            _, manifest, stats = import_snapshot(args.directory, args.name)
+        except (OSError, ValueError) as e:
+            print(f"Error importing snapshot: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(
+            f"Restored {stats['chunks']} chunks of {manifest.get('title') or manifest.get('source')} "
+            f"in {stats['total_seconds']:.2f}s (writing {stats['write_seconds']:.2f}s, "
+            f"keyword index {stats['lexical_seconds']:.2f}s, global index {stats['global_seconds']:.2f}s)"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# services/sqlite_lru.py
+# Size accounting and LRU eviction shared by the SQLite-backed caches.
+# Each table has the columns (key TEXT PRIMARY KEY, <value>, size INTEGER, last_access REAL).
+
+# SQLite limits the number of parameters in one statement
+SQL_BATCH = 500
+
+def stored_bytes(conn, table):
+    """Return the total size of every row in table"""
+    return conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+def existing_bytes(conn, table, keys):
+    """Return the total size of the rows already stored under keys"""
+    total = 0
+    for i in range(0, len(keys), SQL_BATCH):
+        batch = keys[i:i + SQL_BATCH]
+        total += conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {table} WHERE key IN ({','.join('?' * len(batch))})", batch
+        ).fetchone()[0]
+    return total
+
+# Write rows and report how much the table grew, so replacing a key is not counted twice
+def replace_rows(conn, table, value_column, rows):
+    """INSERT OR REPLACE (key, value, size, last_access) rows and return the change in stored bytes"""
+    # A key given twice is stored once, with its last value
+    rows = list({row[0]: row for row in rows}.values())
+    replaced = existing_bytes(conn, table, [row[0] for row in rows])
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table} (key, {value_column}, size, last_access) VALUES (?, ?, ?, ?)", rows
+    )
+    return sum(row[2] for row in rows) - replaced
+
+def evict_lru(conn, table, max_bytes):
+    """Delete the least recently used rows until table fits in max_bytes; return the bytes left"""
+    # Other processes may share the file, so recount before deleting anything
+    total_bytes = stored_bytes(conn, table)
+    rows = conn.execute(f"SELECT key, size FROM {table} ORDER BY last_access").fetchall()
+    evicted = []
+    for key, size in rows:
+        if total_bytes <= max_bytes:
+            break
+        evicted.append((key,))
+        total_bytes -= size
+    conn.executemany(f"DELETE FROM {table} WHERE key = ?", evicted)
+    return total_bytes
@@ -1,14 +1,66 @@
 # services/vector_db.py
+import os
 import streamlit as st
 import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import chromadb
 from chromadb.utils import embedding_functions
 
+from services.answer_cache import get_answer_cache
+from services.embedding_cache import get_embedding_cache, get_model_id, CachedEmbeddingFunction
+from services.embedding_workers import get_parallel_embedding_function
+from services.vector_stores.chroma_store import ChromaVectorStore
+from services.vector_stores.memory_store import MemoryVectorStore
+from services.lexical_index import get_lexical_index, drop_lexical_index
+from services.collection_registry import get_collection_registry, COLLECTION_TTL_DAYS
+from services.global_index import (
+    GLOBAL_INDEX_ENABLED, GLOBAL_COLLECTION_NAME, build_global_where, global_chunk_id, split_global_chunk_id
+)
+from utils.reranking import mmr_select, MMR_LAMBDA
+
+logger = logging.getLogger(__name__)
+
+# Where the Chroma backend keeps its collections
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+
+# Vector store backend for new stores: "chroma" or "faiss"
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+
+# Keep newly processed content in memory until it is processed again or pinned
+EPHEMERAL_COLLECTIONS = os.getenv("EPHEMERAL_COLLECTIONS", "0") != "0"
+EPHEMERAL_MAX_COLLECTIONS = int(os.getenv("EPHEMERAL_MAX_COLLECTIONS", "32"))
+
+# Combine BM25 keyword search with vector search when retrieving chunks
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+
+# Reciprocal-rank fusion constant; larger values flatten the advantage of top ranks
+RRF_K = 60
+
+# Runs keyword searches alongside the vector search, and searches of several stores at once
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+
+# Recently embedded queries, most recently used last
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+_query_embeddings = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+# Evicts and compacts collections off the request path, one job at a time
+_maintenance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="collection-maintenance")
+
 # Initialize ChromaDB client
 @st.cache_resource
 def get_chroma_client():
     """Create a persistent client that saves data to disk"""
-    client = chromadb.PersistentClient(path="./chroma_db")
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
     return client
 
 # Use ChromaDB's default embedding function
@@ -18,6 +70,41 @@ def get_embedding_function():
     default_ef = embedding_functions.DefaultEmbeddingFunction()
     return default_ef
 
+# Name the model behind stored vectors, so vectors of different models are never mixed
+def get_embedding_model_id():
+    """Return the identifier of the embedding model used for documents and queries"""
+    return get_model_id(get_embedding_function())
+
+# Embedding function that reuses vectors computed for the same text before
+def get_cached_embedding_function(parallel=False):
+    """Return the default embedding function wrapped in the persistent embedding cache.
+
+    With parallel=True, texts missing from the cache are embedded by the worker pool
+    when EMBED_WORKERS is above 1.
+    """
+    embedding_func = get_embedding_function()
+    worker_func = get_parallel_embedding_function() if parallel else None
+    cache = get_embedding_cache()
+    if cache is None:
+        return worker_func or embedding_func
+    # Workers run the same model, so their vectors share the cache entries
+    return CachedEmbeddingFunction(worker_func or embedding_func, cache, model_id=get_model_id(embedding_func))
+
+# Texts per embedding call; large enough to keep the ONNX model busy without huge padding
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+
+# Embed many documents with a few large calls to the embedding function
+def embed_documents(documents, batch_size=EMBED_BATCH_SIZE):
+    """Return one embedding per document"""
+    embedding_func = get_cached_embedding_function(parallel=True)
+    # The worker pool batches on its own and needs the whole input to keep every worker busy
+    if get_parallel_embedding_function():
+        batch_size = max(len(documents), 1)
+    embeddings = []
+    for i in range(0, len(documents), batch_size):
+        embeddings.extend(embedding_func(documents[i:i + batch_size]))
+    return embeddings
+
 # Create or get vector database collection
 def get_or_create_collection(collection_name):
     """Get an existing collection or create a new one"""
@@ -32,55 +119,698 @@ def get_or_create_collection(collection_name):
     
     return collection
 
+_vector_stores = {}
+_vector_stores_lock = threading.Lock()
+
+# Open a collection with a given backend
+def _open_store(collection_name, backend):
+    if backend == "faiss":
+        # Imported lazily so the Chroma backend works without faiss installed
+        from services.vector_stores.faiss_store import FaissVectorStore
+        return FaissVectorStore(collection_name)
+    try:
+        max_batch_size = get_chroma_client().get_max_batch_size()
+    except Exception:
+        max_batch_size = 5000
+    return ChromaVectorStore(get_or_create_collection(collection_name), max_batch_size, path=CHROMA_DB_PATH)
+
+# Get the vector store of a collection using the configured backend
+def get_vector_store(collection_name):
+    """Return the shared vector store for a collection, opening it on first use"""
+    with _vector_stores_lock:
+        store = _vector_stores.get(collection_name)
+        if store is None:
+            store = _open_store(collection_name, VECTOR_STORE_BACKEND)
+            _vector_stores[collection_name] = store
+        return store
+
+# Sessions keep their store across reruns; maintenance or the CLI may have deleted its collection since
+def resolve_vector_store(store):
+    """Return the open store for a session's store, or None if its collection no longer exists"""
+    if store is None or not store.persistent:
+        # In-memory stores hold their own data and are never closed
+        return store
+    collection_name = store.collection_name
+    if get_collection_registry().get(collection_name) is None:
+        with _vector_stores_lock:
+            _vector_stores.pop(collection_name, None)
+        return None
+    # A store that was closed and reopened in the meantime is replaced by the open one
+    return get_vector_store(collection_name)
+
+# In-memory collections with the metadata they were ingested with, least recently created first
+_ephemeral_stores = OrderedDict()
+
+# Pick the store an ingest writes to
+def _store_for_ingest(collection_name, ephemeral, metadata):
+    with _vector_stores_lock:
+        reused = collection_name in _ephemeral_stores
+        known = collection_name in _vector_stores
+    # Content processed a second time is worth keeping
+    if reused:
+        return promote_collection(collection_name)
+    if not ephemeral or known or get_collection_registry().get(collection_name):
+        return get_vector_store(collection_name)
+
+    store = MemoryVectorStore(collection_name)
+    with _vector_stores_lock:
+        _ephemeral_stores[collection_name] = (store, dict(metadata or {}))
+        while len(_ephemeral_stores) > EPHEMERAL_MAX_COLLECTIONS:
+            dropped, _ = _ephemeral_stores.popitem(last=False)
+            drop_lexical_index(dropped)
+            get_answer_cache().invalidate(dropped)
+    return store
+
+# Move an in-memory collection into the persistent backend
+def promote_collection(collection_name):
+    """Write an ephemeral collection to the configured backend and return the persistent store"""
+    with _vector_stores_lock:
+        store, metadata = _ephemeral_stores.pop(collection_name, (None, {}))
+    persistent_store = get_vector_store(collection_name)
+    if store is None:
+        return persistent_store
+
+    # The embeddings move over as they are; nothing is embedded again
+    ids, vectors, documents, metadatas = store.export()
+    write_batch_size = persistent_store.get_max_batch_size()
+    for i in range(0, len(ids), write_batch_size):
+        persistent_store.upsert(
+            ids[i:i + write_batch_size], vectors[i:i + write_batch_size],
+            documents[i:i + write_batch_size], metadatas[i:i + write_batch_size]
+        )
+    persistent_store.persist()
+    sync_global_index(collection_name, persistent_store)
+    get_lexical_index(collection_name).persist()
+    get_collection_registry().record(
+        collection_name, VECTOR_STORE_BACKEND, persistent_store.count(), persistent_store.disk_bytes() or 0,
+        source=metadata.get("source"), title=metadata.get("title"), content_type=metadata.get("type"),
+        summary=metadata.get("summary")
+    )
+    schedule_collection_maintenance(protect=[collection_name])
+    return persistent_store
+
+# Look up a collection wherever it lives, without creating it
+def find_collection(collection_name):
+    """Return the store of an existing collection with its registry record or, for an in-memory
+    collection, its ingest metadata; (None, None) if there is no such collection"""
+    with _vector_stores_lock:
+        ephemeral = _ephemeral_stores.get(collection_name)
+    if ephemeral is not None:
+        return ephemeral
+    record = get_collection_registry().get(collection_name)
+    if record is None or collection_name == GLOBAL_COLLECTION_NAME:
+        return None, None
+    if record["backend"] == VECTOR_STORE_BACKEND:
+        return get_vector_store(collection_name), record
+    return _open_store(collection_name, record["backend"]), record
+
+# Keep a collection regardless of the eviction budget
+def pin_collection(collection_name):
+    """Promote a collection if it only lives in memory and pin it.
+
+    Returns the persistent store and whether it was pinned, or (None, False) if the collection
+    does not exist (for instance because it was evicted).
+    """
+    store, _ = find_collection(collection_name)
+    if store is None:
+        return None, False
+    if not store.persistent:
+        store = promote_collection(collection_name)
+    return store, get_collection_registry().set_pinned(collection_name)
+
+# Hash a chunk's text so unchanged chunks can be recognized on re-ingestion
+def chunk_hash(chunk):
+    """Return a stable content hash for a text chunk"""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+# Query parameters that only track where a visitor came from
+_TRACKING_PARAMETERS = {"fbclid", "gclid", "ref", "si"}
+
+# Reduce the spellings of one address to a single form
+def normalize_url(url):
+    """Return a canonical form of a URL for naming and namespacing its content"""
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+
+    query = [
+        (key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMETERS
+    ]
+    # A YouTube video is the same video whichever link form or playlist it was opened from
+    if host == "youtu.be":
+        host, query, path = "youtube.com", [("v", parts.path.strip("/"))], "/watch"
+    else:
+        path = parts.path.rstrip("/") or "/"
+        if host == "youtube.com" and path == "/watch":
+            query = [(key, value) for key, value in query if key == "v"]
+
+    return urllib.parse.urlunsplit((scheme, host, path, urllib.parse.urlencode(sorted(query)), ""))
+
+# Name the collection of a source after its address, so different sources never share one
+def collection_name_for_url(url):
+    """Return a valid collection name derived from the normalized URL"""
+    return "src_" + hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()[:32]
+
+# Namespace chunk ids by source so two sources with a shared passage never overwrite each other
+def chunk_id_for(chunk, source=None):
+    """Return a deterministic id for a chunk of the given source"""
+    content_hash = chunk_hash(chunk)
+    if not source:
+        return content_hash
+    source_hash = hashlib.sha256(normalize_url(source).encode("utf-8")).hexdigest()[:16]
+    return f"{source_hash}_{content_hash}"
+
 # Store text chunks in vector database
-def store_chunks_in_vector_db(chunks, collection_name, metadata=None):
-    """Store text chunks in the vector database"""
-    collection = get_or_create_collection(collection_name)
+def store_chunks_in_vector_db(chunks, collection_name, metadata=None, chunk_metadatas=None, ephemeral=None, summary=None):
+    """Store text chunks in the vector database, only embedding chunks that changed.
+
+    chunk_metadatas optionally holds one dict per chunk (such as its offsets) that is
+    merged into the shared metadata. Chunk ids are derived from the source and the chunk
+    text, so storing the same content again is a no-op. Returns the vector store and a dict
+    with the number of added, unchanged and deleted chunks.
+
+    With ephemeral=True (default EPHEMERAL_COLLECTIONS), content seen for the first time is
+    kept in memory only; processing it again or pinning it moves it to the persistent store.
+    The summary, if given, is kept in the collection registry alongside the collection.
+    """
+    if ephemeral is None:
+        ephemeral = EPHEMERAL_COLLECTIONS
+    store = _store_for_ingest(collection_name, ephemeral, dict(metadata or {}, summary=summary))
+    
+    # Prepare documents, ids, and metadata; identical chunks are stored once
+    metadatas = [dict(metadata) for _ in chunks] if metadata else [{"chunk_id": i} for i in range(len(chunks))]
+    if chunk_metadatas:
+        for chunk_metadata, extra in zip(metadatas, chunk_metadatas):
+            chunk_metadata.update(extra)
+    
+    source = metadata.get("source") if metadata else None
+    source_key = normalize_url(source) if source else None
+    unique = {}
+    for chunk, chunk_metadata in zip(chunks, metadatas):
+        chunk_id = chunk_id_for(chunk, source)
+        if chunk_id not in unique:
+            chunk_metadata["chunk_hash"] = chunk_hash(chunk)
+            if source_key:
+                chunk_metadata["source_key"] = source_key
+            unique[chunk_id] = (chunk, chunk_metadata)
     
-    # Clear existing data if any
+    # Diff against the chunks already stored for this source, however its URL was spelled.
+    # Without a source there is nothing to diff against: other chunks of the collection
+    # may belong to other content, so only look up the chunks being stored and delete nothing.
     try:
-        collection.delete(where={"source": metadata.get("source", "unknown")})
-    except:
-        pass
+        if source_key:
+            existing_ids = set(store.get_ids(where={"source_key": source_key}))
+        else:
+            existing_ids = set(store.get(list(unique))["ids"])
+    except Exception:
+        existing_ids = set()
+    
+    removed_ids = list(existing_ids - unique.keys()) if source_key else []
+    unchanged_ids = [chunk_id for chunk_id in unique if chunk_id in existing_ids]
+    new_ids = [chunk_id for chunk_id in unique if chunk_id not in existing_ids]
+    
+    if removed_ids:
+        store.delete(removed_ids)
     
-    # Prepare documents, ids, and metadata
-    ids = [f"chunk_{i}" for i in range(len(chunks))]
-    metadatas = [metadata] * len(chunks) if metadata else [{"chunk_id": i} for i in range(len(chunks))]
+    # Unchanged chunks keep their embeddings; only metadata that differs, such as offsets, is rewritten
+    updated_ids = []
+    if unchanged_ids:
+        stored = store.get(unchanged_ids)
+        stored_metadatas = dict(zip(stored["ids"], stored["metadatas"]))
+        updated_ids = [chunk_id for chunk_id in unchanged_ids if stored_metadatas.get(chunk_id) != unique[chunk_id][1]]
+    if updated_ids:
+        store.update_metadatas(updated_ids, [unique[chunk_id][1] for chunk_id in updated_ids])
     
-    # Add documents to collection in batches to avoid timeout
-    batch_size = 10
-    for i in range(0, len(chunks), batch_size):
-        end_idx = min(i + batch_size, len(chunks))
+    # Embed new chunks in large batches, then write them with as few calls as the store allows
+    embed_start = time.perf_counter()
+    documents = [unique[chunk_id][0] for chunk_id in new_ids]
+    embeddings = embed_documents(documents)
+    embed_seconds = time.perf_counter() - embed_start
+    
+    write_start = time.perf_counter()
+    write_batch_size = store.get_max_batch_size()
+    failed_ids = set()
+    for i in range(0, len(new_ids), write_batch_size):
+        batch_ids = new_ids[i:i + write_batch_size]
         try:
-            collection.add(
-                documents=chunks[i:end_idx],
-                ids=ids[i:end_idx],
-                metadatas=metadatas[i:end_idx]
+            store.upsert(
+                batch_ids,
+                embeddings[i:i + write_batch_size],
+                documents[i:i + write_batch_size],
+                [unique[chunk_id][1] for chunk_id in batch_ids]
             )
-            time.sleep(0.5)  # Reduced delay since we're not calling external API
         except Exception as e:
+            logger.exception("Error adding documents to vector DB")
             st.error(f"Error adding documents to vector DB: {str(e)}")
-            # Try with smaller batch if there's an error
-            if end_idx - i > 1:
-                for j in range(i, end_idx):
-                    try:
-                        collection.add(
-                            documents=[chunks[j]],
-                            ids=[ids[j]],
-                            metadatas=[metadatas[j]]
-                        )
-                        time.sleep(0.5)
-                    except Exception as inner_e:
-                        st.error(f"Error adding document {j}: {str(inner_e)}")
+            failed_ids.update(batch_ids)
+    # Chunks of a failed batch were never stored, so they are neither counted nor indexed
+    if failed_ids:
+        new_ids = [chunk_id for chunk_id in new_ids if chunk_id not in failed_ids]
+        unique = {chunk_id: record for chunk_id, record in unique.items() if chunk_id not in failed_ids}
+    store.persist()
+    if store.persistent:
+        sync_global_index(collection_name, store, added=new_ids, removed=removed_ids, updated=updated_ids)
+    write_seconds = time.perf_counter() - write_start
     
-    return collection
+    # Keep the keyword index in step; chunks it has not seen yet (including ones stored
+    # before it existed) are indexed from their text
+    lexical_start = time.perf_counter()
+    lexical_index = get_lexical_index(collection_name)
+    lexical_index.update(
+        added=[(chunk_id, chunk) for chunk_id, (chunk, _) in unique.items() if chunk_id not in lexical_index],
+        removed=removed_ids
+    )
+    if store.persistent:
+        lexical_index.persist()
+    lexical_seconds = time.perf_counter() - lexical_start
+    
+    # Cached answers may no longer match the stored content
+    if new_ids or removed_ids:
+        get_answer_cache().invalidate(collection_name)
+    
+    # Record the collection's size, then evict past the budget and compact in the background
+    if store.persistent:
+        metadata = metadata or {}
+        get_collection_registry().record(
+            collection_name, VECTOR_STORE_BACKEND, store.count(), store.disk_bytes() or 0,
+            source=source, title=metadata.get("title"), content_type=metadata.get("type"), summary=summary
+        )
+        schedule_collection_maintenance(protect=[collection_name], compact=[collection_name] if removed_ids else [])
+    
+    stats = {
+        "added": len(new_ids),
+        "unchanged": len(unchanged_ids),
+        "deleted": len(removed_ids),
+        "embed_seconds": embed_seconds,
+        "write_seconds": write_seconds,
+        "lexical_seconds": lexical_seconds
+    }
+    return store, stats
+
+# Embed a query once so the embedding can be reused for search and caching
+def embed_query(query):
+    """Return the embedding of a query string"""
+    return embed_queries([query])[0]
+
+# Normalize a query so trivially different phrasings share a cache entry
+def _query_cache_key(query):
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+# Embed several queries with one model call, reusing recently seen ones
+def embed_queries(queries):
+    """Return one embedding per query"""
+    keys = [_query_cache_key(query) for query in queries]
+    embeddings = {}
+    with _query_embeddings_lock:
+        for key in keys:
+            if key in _query_embeddings:
+                _query_embeddings.move_to_end(key)
+                embeddings[key] = _query_embeddings[key]
+    
+    # Embed each missing query once, even if it repeats within the batch
+    missing = {key: query for key, query in zip(keys, queries) if key not in embeddings}
+    if missing:
+        computed = get_cached_embedding_function()(list(missing.values()))
+        with _query_embeddings_lock:
+            for key, embedding in zip(missing, computed):
+                embeddings[key] = embedding
+                _query_embeddings[key] = embedding
+                _query_embeddings.move_to_end(key)
+            while len(_query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                _query_embeddings.popitem(last=False)
+    
+    return [embeddings[key] for key in keys]
 
 # Fetch relevant chunks from vector database
-def query_vector_db(query, collection, n_results=5):
+def query_vector_db(query, store, n_results=5, query_embedding=None):
     """Query the vector database to find relevant content chunks"""
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
+    return batch_query_vector_db(
+        [query], store, n_results=n_results,
+        query_embeddings=[query_embedding] if query_embedding is not None else None
     )
+
+# Fetch relevant chunks with both keyword and vector search
+def hybrid_query_vector_db(query, store, n_results=5, query_embedding=None):
+    """Fuse BM25 and vector search results with reciprocal-rank fusion.
+
+    Results use the same layout as query_vector_db; "distances" hold 1 minus the fused
+    score so that lower still means more relevant.
+    """
+    return batch_query_vector_db(
+        [query], store, n_results=n_results,
+        query_embeddings=[query_embedding] if query_embedding is not None else None,
+        hybrid=True
+    )
+
+# Search many queries against one or more vector stores together
+def batch_query_vector_db(queries, stores, n_results=5, query_embeddings=None, hybrid=False):
+    """Embed all queries with one model call and search every store with them.
+
+    For a single store, returns one result in Chroma's layout holding a list per query.
+    For a list of stores, returns one such result per store, in the same order.
+    With hybrid=True, each query's vector results are fused with its BM25 results.
+    """
+    single_store = not isinstance(stores, (list, tuple))
+    stores = [stores] if single_store else list(stores)
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+    
+    registry = get_collection_registry()
+    for store in stores:
+        registry.touch(store.collection_name)
+    
+    def search(store):
+        if hybrid:
+            lexical_index = get_lexical_index(store.collection_name)
+            lexical_futures = [_lexical_executor.submit(lexical_index.search, query, n_results) for query in queries]
+        results = store.query(query_embeddings, n_results=n_results)
+        if hybrid:
+            results = _fuse_results(store, results, [future.result() for future in lexical_futures], n_results)
+        return results
+    
+    if len(stores) == 1:
+        all_results = [search(stores[0])]
+    else:
+        all_results = list(_search_executor.map(search, stores))
+    return all_results[0] if single_store else all_results
+
+# Combine per-query vector results and BM25 hits into one ranking per query
+def _fuse_results(store, vector_results, lexical_hits, n_results):
+    fused_scores = []
+    records = {}
+    for query_index, hits in enumerate(lexical_hits):
+        fused = {}
+        for rank, (chunk_id, document, chunk_metadata) in enumerate(zip(
+            vector_results["ids"][query_index],
+            vector_results["documents"][query_index],
+            vector_results["metadatas"][query_index]
+        )):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            records[chunk_id] = (document, chunk_metadata)
+        for rank, (chunk_id, _) in enumerate(hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        fused_scores.append(fused)
+    
+    # Keyword-only hits still need their text and metadata
+    missing = list(dict.fromkeys(chunk_id for hits in lexical_hits for chunk_id, _ in hits if chunk_id not in records))
+    if missing:
+        fetched = store.get(missing)
+        for chunk_id, document, chunk_metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            records[chunk_id] = (document, chunk_metadata)
+    
+    results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for fused in fused_scores:
+        ranked = sorted((chunk_id for chunk_id in fused if chunk_id in records), key=fused.get, reverse=True)[:n_results]
+        results["ids"].append(ranked)
+        results["documents"].append([records[chunk_id][0] for chunk_id in ranked])
+        results["metadatas"].append([records[chunk_id][1] for chunk_id in ranked])
+        results["distances"].append([1.0 - fused[chunk_id] for chunk_id in ranked])
+    return results
+
+# Remove a collection and everything derived from it
+def delete_collection(collection_name):
+    """Delete a collection's vectors, keyword index, cached answers and registry record"""
+    registry = get_collection_registry()
+    record = registry.get(collection_name)
+    backend = record["backend"] if record else VECTOR_STORE_BACKEND
+    with _vector_stores_lock:
+        store = _vector_stores.pop(collection_name, None)
+        _ephemeral_stores.pop(collection_name, None)
+    
+    if backend == "faiss":
+        from services.vector_stores.faiss_store import FAISS_STORE_PATH
+        if store is not None:
+            store.close()
+        shutil.rmtree(os.path.join(FAISS_STORE_PATH, collection_name), ignore_errors=True)
+    else:
+        try:
+            get_chroma_client().delete_collection(name=collection_name)
+        except Exception:
+            # Already gone
+            pass
+    
+    if GLOBAL_INDEX_ENABLED:
+        global_store = get_vector_store(GLOBAL_COLLECTION_NAME)
+        global_store.delete(global_store.get_ids(where={"collection": collection_name}))
+        global_store.persist()
+        _record_global_index(global_store)
+    
+    drop_lexical_index(collection_name)
+    get_answer_cache().invalidate(collection_name)
+    registry.remove(collection_name)
+
+# Treat a found collection as last used when it was last written, but never as already expired
+def _discovered_last_access(path):
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        modified = time.time()
+    # Collections found on disk get at least half the TTL before they can expire
+    return max(modified, time.time() - COLLECTION_TTL_DAYS * 86400 / 2) if COLLECTION_TTL_DAYS else modified
+
+# Register collections written before the registry existed, as the least recently used
+def discover_collections():
+    """Add stored collections missing from the registry and return their names"""
+    registry = get_collection_registry()
+    known = {record["name"] for record in registry.list()}
+    found = []
+    
+    # The global index is recorded, pinned, once it has been written to
+    if GLOBAL_INDEX_ENABLED and GLOBAL_COLLECTION_NAME not in known and _stored_collection_exists(GLOBAL_COLLECTION_NAME):
+        _record_global_index(get_vector_store(GLOBAL_COLLECTION_NAME))
+    
+    for collection in get_chroma_client().list_collections():
+        # Older clients list names, newer ones list collection objects
+        name = getattr(collection, "name", collection)
+        if name not in known and name != GLOBAL_COLLECTION_NAME:
+            store = ChromaVectorStore(get_chroma_client().get_collection(name=name), path=CHROMA_DB_PATH)
+            registry.record(
+                name, "chroma", store.count(), store.disk_bytes() or 0,
+                last_access=_discovered_last_access(os.path.join(CHROMA_DB_PATH, "chroma.sqlite3"))
+            )
+            # Stored before the global index, so its chunks are not mirrored yet
+            sync_global_index(name, store)
+            found.append(name)
+    
+    try:
+        from services.vector_stores.faiss_store import FAISS_STORE_PATH, FaissVectorStore
+    except ImportError:
+        return found
+    if os.path.isdir(FAISS_STORE_PATH):
+        for entry in os.scandir(FAISS_STORE_PATH):
+            if entry.is_dir() and entry.name not in known and entry.name != GLOBAL_COLLECTION_NAME:
+                store = FaissVectorStore(entry.name)
+                registry.record(entry.name, "faiss", store.count(), store.disk_bytes(), last_access=_discovered_last_access(entry.path))
+                sync_global_index(entry.name, store)
+                store.close()
+                found.append(entry.name)
+    return found
+
+# Reclaim the space of deleted chunks and evicted collections
+def compact_collections(collection_names=None, vacuum_chroma=True):
+    """Compact the given FAISS collections (default: all) and optionally shrink Chroma's shared database file.
+
+    The global index mirrors every collection, so it is compacted along with them once enough
+    of it is deleted rows.
+    """
+    registry = get_collection_registry()
+    if collection_names is not None and GLOBAL_INDEX_ENABLED and VECTOR_STORE_BACKEND == "faiss":
+        if get_vector_store(GLOBAL_COLLECTION_NAME).needs_compaction():
+            collection_names = list(collection_names) + [GLOBAL_COLLECTION_NAME]
+    for record in registry.list():
+        if record["backend"] != "faiss" or (collection_names is not None and record["name"] not in collection_names):
+            continue
+        with _vector_stores_lock:
+            store = _vector_stores.get(record["name"])
+        opened = store is None
+        if opened:
+            store = _open_store(record["name"], "faiss")
+        store.compact()
+        registry.record(record["name"], "faiss", store.count(), store.disk_bytes())
+        if opened:
+            store.close()
+    
+    # Chroma shares one SQLite file between collections; deleted collections leave free pages behind
+    chroma_file = os.path.join(CHROMA_DB_PATH, "chroma.sqlite3")
+    if vacuum_chroma and os.path.exists(chroma_file):
+        try:
+            conn = sqlite3.connect(chroma_file, timeout=5)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            # Busy with a write; the next maintenance run will try again
+            pass
+
+# Keep the stored collections within their budget
+def maintain_collections(protect=(), compact=()):
+    """Evict collections beyond the configured budget, then compact what changed; returns the evicted names"""
+    registry = get_collection_registry()
+    backends = {record["name"]: record["backend"] for record in registry.list()}
+    evicted = registry.plan_eviction(protect=set(protect))
+    for collection_name in evicted:
+        delete_collection(collection_name)
+    if evicted or compact:
+        compact_collections(list(compact), vacuum_chroma=any(backends[name] == "chroma" for name in evicted))
+    return evicted
+
+def schedule_collection_maintenance(protect=(), compact=()):
+    """Run maintain_collections on the background maintenance thread"""
+    def run():
+        try:
+            maintain_collections(protect, compact)
+        except Exception:
+            logger.exception("Error maintaining collections")
+    return _maintenance_executor.submit(run)
+
+# Trade a little relevance for variety among retrieved chunks
+def diversify_results(store, results, query_embeddings, n_results, lambda_=MMR_LAMBDA, hybrid=False):
+    """Re-rank each query's candidates with Maximal Marginal Relevance and keep n_results of them.
+
+    results is a Chroma-layout result from over-fetching; the candidates' embeddings are read
+    back from the store. Hybrid results are ranked by their fused score rather than by
+    similarity to the query, so keyword-only matches keep their place.
+    """
+    diversified = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for query_index, ids in enumerate(results["ids"]):
+        if len(ids) <= n_results:
+            selected = list(range(len(ids)))
+        else:
+            relevance = None
+            if hybrid:
+                # Fused scores are tiny; stretch them to the 0-1 range of cosine similarities
+                scores = -np.asarray(results["distances"][query_index], dtype=np.float32)
+                relevance = (scores - scores.min()) / max(float(scores.max() - scores.min()), 1e-12)
+            if store.collection_name == GLOBAL_COLLECTION_NAME:
+                # Global results carry the chunks' own ids; the global index keys them by collection too
+                ids = [
+                    global_chunk_id((chunk_metadata or {}).get("collection", ""), chunk_id)
+                    for chunk_id, chunk_metadata in zip(ids, results["metadatas"][query_index])
+                ]
+            selected = mmr_select(query_embeddings[query_index], store.get_embeddings(ids), n_results, lambda_, relevance)
+        for key in diversified:
+            diversified[key].append([results[key][query_index][i] for i in selected])
+    return diversified
+
+# Mirror a collection's chunks into the global index, reusing their stored embeddings
+def sync_global_index(collection_name, store, added=None, removed=None, updated=None):
+    """Make the global index hold exactly the chunks of a collection, tagged with its name.
+
+    An ingest passes the ids it added, removed and changed the metadata of, and only those
+    rows are written. Without them every chunk is compared, as imports and backfills need.
+    """
+    if not GLOBAL_INDEX_ENABLED or collection_name == GLOBAL_COLLECTION_NAME:
+        return
+    global_store = get_vector_store(GLOBAL_COLLECTION_NAME)
+    if added is None and removed is None and updated is None:
+        current_ids = store.get_ids()
+        indexed_ids = set(global_store.get_ids(where={"collection": collection_name}))
+        stale_ids = list(indexed_ids - {global_chunk_id(collection_name, chunk_id) for chunk_id in current_ids})
+        changed_ids = current_ids
+    else:
+        stale_ids = [global_chunk_id(collection_name, chunk_id) for chunk_id in removed or []]
+        indexed_ids = {global_chunk_id(collection_name, chunk_id) for chunk_id in updated or []}
+        changed_ids = list(updated or []) + list(added or [])
+        if not stale_ids and not changed_ids:
+            return
+    
+    if stale_ids:
+        global_store.delete(stale_ids)
+    
+    # Chunks already mirrored may have new offsets; the rest are copied with their embeddings
+    batch_size = global_store.get_max_batch_size()
+    for i in range(0, len(changed_ids), batch_size):
+        records = store.get(changed_ids[i:i + batch_size])
+        global_ids = [global_chunk_id(collection_name, chunk_id) for chunk_id in records["ids"]]
+        metadatas = [dict(chunk_metadata or {}, collection=collection_name) for chunk_metadata in records["metadatas"]]
+        known = [j for j, global_id in enumerate(global_ids) if global_id in indexed_ids]
+        missing = [j for j, global_id in enumerate(global_ids) if global_id not in indexed_ids]
+        if known:
+            global_store.update_metadatas([global_ids[j] for j in known], [metadatas[j] for j in known])
+        if missing:
+            global_store.upsert(
+                [global_ids[j] for j in missing],
+                store.get_embeddings([records["ids"][j] for j in missing]),
+                [records["documents"][j] for j in missing],
+                [metadatas[j] for j in missing]
+            )
+    global_store.persist()
+    _record_global_index(global_store)
+
+# The global index duplicates every collection, so its size counts towards the disk budget
+def _record_global_index(global_store):
+    registry = get_collection_registry()
+    record = registry.get(GLOBAL_COLLECTION_NAME)
+    registry.record(GLOBAL_COLLECTION_NAME, VECTOR_STORE_BACKEND, global_store.count(), global_store.disk_bytes() or 0)
+    # Pinned so eviction never picks it; it shrinks as the collections it mirrors are evicted
+    if not (record and record["pinned"]):
+        registry.set_pinned(GLOBAL_COLLECTION_NAME)
+
+def _stored_collection_exists(collection_name):
+    if VECTOR_STORE_BACKEND == "faiss":
+        from services.vector_stores.faiss_store import FAISS_STORE_PATH
+        return os.path.isdir(os.path.join(FAISS_STORE_PATH, collection_name))
+    names = [getattr(collection, "name", collection) for collection in get_chroma_client().list_collections()]
+    return collection_name in names
+
+# Rebuild the global index from every registered collection
+def rebuild_global_index():
+    """Sync every registered collection into the global index and drop chunks of unknown collections"""
+    registry = get_collection_registry()
+    records = registry.list()
+    for record in records:
+        if record["name"] == GLOBAL_COLLECTION_NAME:
+            continue
+        store = get_vector_store(record["name"]) if record["backend"] == VECTOR_STORE_BACKEND else _open_store(record["name"], record["backend"])
+        sync_global_index(record["name"], store)
+    names = [record["name"] for record in records]
+    
+    global_store = get_vector_store(GLOBAL_COLLECTION_NAME)
+    known = set(names)
+    orphaned = [
+        chunk_id for chunk_id, chunk_metadata in zip(*_ids_and_metadatas(global_store))
+        if (chunk_metadata or {}).get("collection") not in known
+    ]
+    if orphaned:
+        global_store.delete(orphaned)
+        global_store.persist()
+    _record_global_index(global_store)
+
+def _ids_and_metadatas(store):
+    ids = store.get_ids()
+    metadatas = []
+    batch_size = store.get_max_batch_size()
+    for i in range(0, len(ids), batch_size):
+        metadatas.extend(store.get(ids[i:i + batch_size])["metadatas"])
+    return ids, metadatas
+
+# Search every processed source at once
+def global_query_vector_db(query, n_results=10, types=None, sources=None, query_embedding=None):
+    """Query the global index, optionally restricted to content types and source URLs.
+
+    Returns a result in Chroma's layout for the one query, holding the chunks' own ids;
+    group_results_by_source turns it into one group per source. A chunk stored in several
+    collections is returned once.
+    """
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    where = build_global_where(types, [normalize_url(source) for source in sources] if sources else None)
+    results = get_vector_store(GLOBAL_COLLECTION_NAME).query([query_embedding], n_results=n_results, where=where)
     
-    return results
\ No newline at end of file
+    unique = {}
+    for global_id, document, chunk_metadata, distance in zip(
+        results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+    ):
+        unique.setdefault(split_global_chunk_id(global_id)[1], (document, chunk_metadata, distance))
+    return {
+        "ids": [list(unique)],
+        "documents": [[record[0] for record in unique.values()]],
+        "metadatas": [[record[1] for record in unique.values()]],
+        "distances": [[record[2] for record in unique.values()]]
+    }
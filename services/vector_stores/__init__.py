@@ -0,0 +1,2 @@
+# services/vector_stores/__init__.py
+# This file makes the vector_stores directory a Python package
\ No newline at end of file
@@ -0,0 +1,101 @@
+# services/vector_stores/chroma_store.py
+import os
+import sqlite3
+
+import numpy as np
+
+from services.vector_stores.store_base import BaseVectorStore
+
+# Chroma wants filters on several keys spelled as an explicit $and
+def _chroma_where(where):
+    if where and len(where) > 1:
+        return {"$and": [{key: value} for key, value in where.items()]}
+    return where or None
+
+class ChromaVectorStore(BaseVectorStore):
+    """Vector store backed by a Chroma collection"""
+    
+    def __init__(self, collection, max_batch_size=5000, path=None):
+        super().__init__(collection.name)
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self.path = path
+    
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Insert or replace records with precomputed embeddings"""
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    
+    # Chroma rejects empty id lists, so calls with nothing to do return before reaching it
+    def update_metadatas(self, ids, metadatas):
+        """Replace the metadata of existing records"""
+        if not len(ids):
+            return
+        self.collection.update(ids=ids, metadatas=metadatas)
+    
+    def delete(self, ids):
+        """Delete records by id"""
+        if not len(ids):
+            return
+        self.collection.delete(ids=ids)
+    
+    def get(self, ids):
+        """Return the "ids", "documents" and "metadatas" of records by id"""
+        if not len(ids):
+            return {"ids": [], "documents": [], "metadatas": []}
+        return self.collection.get(ids=ids, include=["documents", "metadatas"])
+    
+    def get_embeddings(self, ids):
+        """Return the stored embeddings of records as a matrix aligned with ids"""
+        if not len(ids):
+            return np.zeros((0, 0), dtype=np.float32)
+        records = self.collection.get(ids=list(ids), include=["embeddings"])
+        embeddings = dict(zip(records["ids"], records["embeddings"]))
+        return np.asarray([embeddings[chunk_id] for chunk_id in ids], dtype=np.float32)
+    
+    def get_ids(self, where=None):
+        """Return the ids of records whose metadata matches where"""
+        return self.collection.get(where=_chroma_where(where), include=[])["ids"]
+    
+    def query(self, query_embeddings, n_results=5, where=None):
+        """Return the nearest records to each query embedding"""
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=_chroma_where(where))
+    
+    def count(self):
+        """Return the number of stored records"""
+        return self.collection.count()
+    
+    def get_max_batch_size(self):
+        """Return the largest number of records accepted by a single upsert"""
+        return self.max_batch_size
+    
+    def disk_bytes(self):
+        """Return the size of the collection's vector segment plus its stored text and metadata"""
+        if not self.path:
+            return None
+        # Chroma keeps every collection's records in one SQLite file and each HNSW index in a
+        # directory named after its segment; read its schema without going through the client
+        try:
+            conn = sqlite3.connect(f"file:{os.path.join(self.path, 'chroma.sqlite3')}?mode=ro", uri=True, timeout=5)
+            try:
+                segments = conn.execute(
+                    "SELECT id, scope FROM segments WHERE collection = ?", (str(self.collection.id),)
+                ).fetchall()
+                metadata_segments = [segment_id for segment_id, scope in segments if scope == "METADATA"]
+                record_bytes = 0
+                if metadata_segments:
+                    record_bytes = conn.execute(
+                        "SELECT COALESCE(SUM(LENGTH(m.key) + COALESCE(LENGTH(m.string_value), 8)), 0) "
+                        "FROM embedding_metadata m JOIN embeddings e ON e.id = m.id WHERE e.segment_id = ?",
+                        (metadata_segments[0],)
+                    ).fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+        index_bytes = 0
+        for segment_id, scope in segments:
+            directory = os.path.join(self.path, segment_id)
+            if scope == "VECTOR" and os.path.isdir(directory):
+                index_bytes += sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        return index_bytes + record_bytes
@@ -0,0 +1,524 @@
+# services/vector_stores/faiss_store.py
+import os
+import json
+import sqlite3
+import threading
+
+import numpy as np
+import faiss
+
+from services.vector_stores.store_base import BaseVectorStore
+
+# Where FAISS collections are stored, one directory per collection
+FAISS_STORE_PATH = os.getenv("FAISS_STORE_PATH", "./faiss_db")
+
+# Index used for new collections: "flat" (exact), "hnsw", "ivf", or the compressed "sq8"
+# (8-bit scalar codes, 4x smaller) and "pq" (product-quantized codes, 32x smaller at 384 dims)
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+QUANTIZED_INDEX_TYPES = {"sq8", "pq"}
+
+# HNSW graph degree and search breadth
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+# IVF cell count (capped so every cell gets enough training points) and cells probed per query
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "1024"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+
+# PQ sub-quantizers (one byte each); collections too small to train 256-centroid codebooks
+# use SQ8 codes until they grow past FAISS_PQ_MIN_TRAIN vectors
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_PQ_MIN_TRAIN = 39 * 256
+
+# Re-rank this many times the requested results of a quantized search with full-precision vectors
+FAISS_RESCORE = os.getenv("FAISS_RESCORE", "1") != "0"
+FAISS_RESCORE_FACTOR = int(os.getenv("FAISS_RESCORE_FACTOR", "4"))
+
+# Filtered queries score candidates exactly when at most this many records match the filter
+FAISS_EXACT_FILTER_LIMIT = 20000
+
+# Rebuild the index once deleted vectors make up this fraction of it
+FAISS_COMPACT_RATIO = 0.25
+
+# Retrain SQ8 codes each time the collection grows to this multiple of the vectors they were trained on
+FAISS_SQ_RETRAIN_GROWTH = 2
+
+# SQLite limits the number of parameters in one statement
+_SQL_BATCH = 500
+
+class FaissVectorStore(BaseVectorStore):
+    """Vector store keeping a FAISS index on disk and documents and metadata in a SQLite side store.
+
+    Vectors are addressed by integer rows that are never reused. Saved indexes are memory-mapped
+    on load and only read into memory when the collection is written to. Quantized collections
+    also keep their float32 vectors in a row-addressed file that is memory-mapped for re-scoring.
+    """
+
+    def __init__(self, collection_name, directory=FAISS_STORE_PATH, index_type=FAISS_INDEX_TYPE):
+        super().__init__(collection_name)
+        self.path = os.path.join(directory, collection_name)
+        os.makedirs(self.path, exist_ok=True)
+        self.index_path = os.path.join(self.path, "index.faiss")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(os.path.join(self.path, "chunks.sqlite3"), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+        # An existing collection keeps the index type it was built with
+        self.index_type = self._get_meta("index_type", index_type)
+        self.next_row = int(self._get_meta("next_row", "0"))
+        self.tombstones = int(self._get_meta("tombstones", "0"))
+        self.dim = int(self._get_meta("dim", "0"))
+        # Collections saved before this was tracked are retrained on their next write
+        self.trained_on = int(self._get_meta("trained_on", "1"))
+        self.raw_vectors = None
+        self.dirty = False
+        self.writable = False
+        self.index = None
+        if os.path.exists(self.index_path):
+            self.index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP)
+            self._configure(self.index)
+
+    def _get_meta(self, key, default):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _new_index(self, vectors):
+        """Create an empty index of the collection's type, training it on vectors if needed"""
+        dim = vectors.shape[1]
+        self.trained_on = len(vectors)
+        if self.index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+            hnsw.hnsw.efConstruction = max(40, 2 * FAISS_HNSW_M)
+            index = faiss.IndexIDMap2(hnsw)
+        elif self.index_type == "ivf":
+            nlist = max(1, min(FAISS_IVF_NLIST, len(vectors) // 39))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+            index.train(vectors)
+            # IVF takes ids natively; the hashtable lets it remove and reconstruct by id
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        elif self.index_type == "sq8" or (self.index_type == "pq" and len(vectors) < FAISS_PQ_MIN_TRAIN):
+            quantizer = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+            quantizer.train(vectors)
+            index = faiss.IndexIDMap2(quantizer)
+        elif self.index_type == "pq":
+            # Sub-quantizers must divide the dimension evenly
+            m = next(m for m in range(min(FAISS_PQ_M, dim), 0, -1) if dim % m == 0)
+            quantizer = faiss.IndexPQ(dim, m, 8)
+            quantizer.train(vectors)
+            index = faiss.IndexIDMap2(quantizer)
+        elif self.index_type == "flat":
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        else:
+            raise ValueError(f"Unknown FAISS index type: {self.index_type}")
+        self._configure(index)
+        return index
+
+    def _configure(self, index):
+        # Search-time parameters are not all persisted with the index
+        if self.index_type == "hnsw":
+            faiss.downcast_index(index.index).hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+        elif self.index_type == "ivf":
+            index.nprobe = FAISS_IVF_NPROBE
+
+    def _ensure_writable(self):
+        # Memory-mapped indexes are read-only, so load a private copy before the first write
+        if self.index is not None and not self.writable:
+            self.index = faiss.read_index(self.index_path)
+            self._configure(self.index)
+        self.writable = True
+
+    @property
+    def quantized(self):
+        return self.index_type in QUANTIZED_INDEX_TYPES
+
+    def _write_vectors(self, first_row, vectors):
+        # Rows are never reused, so each row owns a fixed slot in the file
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as handle:
+            handle.seek(first_row * self.dim * 4)
+            handle.write(vectors.tobytes())
+        self.raw_vectors = None
+
+    def _vectors_for_rows(self, rows):
+        """Return the full-precision vectors of the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not self.quantized:
+            # Flat, HNSW and IVF indexes store vectors uncompressed
+            return self.index.reconstruct_batch(rows)
+        if self.raw_vectors is None:
+            self.raw_vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dim)
+        return np.asarray(self.raw_vectors[rows])
+
+    def _rows_for_ids(self, ids):
+        rows = []
+        for i in range(0, len(ids), _SQL_BATCH):
+            batch = ids[i:i + _SQL_BATCH]
+            rows.extend(row for (row,) in self.conn.execute(
+                f"SELECT row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            ))
+        return rows
+
+    def _remove_rows(self, rows):
+        if not rows:
+            return
+        self._ensure_writable()
+        self.conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+        if self.index is None:
+            return
+        if self.index_type == "hnsw":
+            # HNSW graphs cannot drop nodes; deleted rows are skipped at query time until compaction
+            self.tombstones += len(rows)
+        else:
+            self.index.remove_ids(faiss.IDSelectorArray(np.asarray(rows, dtype=np.int64)))
+        self.dirty = True
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Insert or replace records with precomputed embeddings"""
+        if not ids:
+            return
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self.lock:
+            self._ensure_writable()
+            self._remove_rows(self._rows_for_ids(list(ids)))
+
+            rows = np.arange(self.next_row, self.next_row + len(ids), dtype=np.int64)
+            self.next_row += len(ids)
+            self.conn.executemany(
+                "INSERT INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (int(row), chunk_id, document, json.dumps(metadata or {}))
+                    for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)
+                ]
+            )
+            if self.index is None:
+                self.dim = vectors.shape[1]
+                self.index = self._new_index(vectors)
+            if self.quantized:
+                self._write_vectors(int(rows[0]), vectors)
+            self.index.add_with_ids(vectors, rows)
+            self.dirty = True
+            # Codes trained on an early batch would quantize the vectors added since then poorly
+            if self._undertrained():
+                self.rebuild()
+
+    def update_metadatas(self, ids, metadatas):
+        """Replace the metadata of existing records"""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}), chunk_id) for chunk_id, metadata in zip(ids, metadatas)]
+            )
+            self.dirty = True
+
+    def delete(self, ids):
+        """Delete records by id"""
+        with self.lock:
+            self._remove_rows(self._rows_for_ids(list(ids)))
+
+    def _where_clause(self, where):
+        # Equality and {"$in": [...]} filters on top-level metadata keys, as used by this app
+        if not where:
+            return "", []
+        conditions, params = [], []
+        for key, value in where.items():
+            column = f"json_extract(metadata, '$.\"{key}\"')"
+            if isinstance(value, dict) and "$in" in value:
+                conditions.append(f"{column} IN ({','.join('?' * len(value['$in']))})" if value["$in"] else "0")
+                params.extend(value["$in"])
+            else:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        return " WHERE " + " AND ".join(conditions), params
+
+    def get(self, ids):
+        """Return the "ids", "documents" and "metadatas" of records by id"""
+        with self.lock:
+            records = {}
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[i:i + _SQL_BATCH])
+                for chunk_id, document, metadata in self.conn.execute(
+                    f"SELECT id, document, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    records[chunk_id] = (document, json.loads(metadata) if metadata else {})
+        found = [chunk_id for chunk_id in ids if chunk_id in records]
+        return {
+            "ids": found,
+            "documents": [records[chunk_id][0] for chunk_id in found],
+            "metadatas": [records[chunk_id][1] for chunk_id in found]
+        }
+
+    def get_embeddings(self, ids):
+        """Return the stored embeddings of records as a matrix aligned with ids"""
+        if not len(ids):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        with self.lock:
+            rows = {}
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[i:i + _SQL_BATCH])
+                rows.update(self.conn.execute(
+                    f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ))
+            return self._vectors_for_rows([rows[chunk_id] for chunk_id in ids])
+
+    def get_ids(self, where=None):
+        """Return the ids of records whose metadata matches where"""
+        clause, params = self._where_clause(where)
+        with self.lock:
+            return [chunk_id for (chunk_id,) in self.conn.execute(f"SELECT id FROM chunks{clause}", params)]
+
+    def count(self):
+        """Return the number of stored records"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _fetch_records(self, rows):
+        records = {}
+        for i in range(0, len(rows), _SQL_BATCH):
+            batch = rows[i:i + _SQL_BATCH]
+            for row, chunk_id, document, metadata in self.conn.execute(
+                f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+            ):
+                records[row] = (chunk_id, document, json.loads(metadata) if metadata else {})
+        return records
+
+    def _exact_search(self, queries, rows, n_results):
+        # Squared L2 like the index itself, so distances are comparable across both paths
+        vectors = self._vectors_for_rows(rows)
+        distances = (
+            (queries ** 2).sum(axis=1, keepdims=True)
+            - 2 * queries @ vectors.T
+            + (vectors ** 2).sum(axis=1)[None, :]
+        )
+        k = min(n_results, len(rows))
+        nearest = np.argsort(distances, axis=1)[:, :k]
+        row_array = np.asarray(rows, dtype=np.int64)
+        return np.take_along_axis(distances, nearest, axis=1), row_array[nearest]
+
+    def _rescore(self, queries, rows):
+        # Replace approximate distances of quantized candidates with exact ones and re-sort
+        valid = rows >= 0
+        vectors = self._vectors_for_rows(np.where(valid, rows, 0).ravel()).reshape(rows.shape + (self.dim,))
+        distances = ((vectors - queries[:, None, :]) ** 2).sum(axis=2)
+        distances[~valid] = np.inf
+        order = np.argsort(distances, axis=1)
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+    def query(self, query_embeddings, n_results=5, where=None):
+        """Return the nearest records to each query embedding"""
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0:
+                return self.empty_results(len(queries))
+
+            allowed = None
+            if where:
+                clause, params = self._where_clause(where)
+                allowed = [row for (row,) in self.conn.execute(f"SELECT row FROM chunks{clause}", params)]
+                if not allowed:
+                    return self.empty_results(len(queries))
+
+            if allowed is not None and len(allowed) <= FAISS_EXACT_FILTER_LIMIT:
+                distances, rows = self._exact_search(queries, allowed, n_results)
+                allowed = None
+            else:
+                # Over-fetch so deleted and filtered-out rows can be skipped, widening until enough remain
+                allowed = set(allowed) if allowed is not None else None
+                rescore = self.quantized and FAISS_RESCORE
+                fetch = min(self.index.ntotal, n_results * (FAISS_RESCORE_FACTOR if rescore else 1) + self.tombstones)
+                while True:
+                    distances, rows = self.index.search(queries, fetch)
+                    if allowed is None or fetch >= self.index.ntotal:
+                        break
+                    matched = min(sum(1 for row in query_rows if row in allowed) for query_rows in rows)
+                    if matched >= n_results:
+                        break
+                    fetch = min(self.index.ntotal, fetch * 4)
+                if rescore:
+                    distances, rows = self._rescore(queries, rows)
+
+            records = self._fetch_records(sorted({int(row) for row in rows.ravel() if row >= 0}))
+
+        results = self.empty_results(len(queries))
+        for query_index, (query_distances, query_rows) in enumerate(zip(distances, rows)):
+            for distance, row in zip(query_distances, query_rows):
+                record = records.get(int(row))
+                if record is None or (allowed is not None and int(row) not in allowed):
+                    continue
+                chunk_id, document, metadata = record
+                results["ids"][query_index].append(chunk_id)
+                results["documents"][query_index].append(document)
+                results["metadatas"][query_index].append(metadata)
+                results["distances"][query_index].append(float(distance))
+                if len(results["ids"][query_index]) == n_results:
+                    break
+        return results
+
+    def rebuild(self):
+        """Rebuild the index from the live records, dropping deleted vectors"""
+        with self.lock:
+            if self.index is None:
+                return
+            self._ensure_writable()
+            rows = [row for (row,) in self.conn.execute("SELECT row FROM chunks ORDER BY row")]
+            if not rows:
+                self.index = None
+            else:
+                row_array = np.asarray(rows, dtype=np.int64)
+                vectors = self._vectors_for_rows(row_array)
+                self.index = self._new_index(vectors)
+                self.index.add_with_ids(vectors, row_array)
+            self.tombstones = 0
+            self.dirty = True
+
+    def _pack_rows(self):
+        """Renumber the live records 0..n-1 and rewrite their raw vectors without the deleted rows"""
+        rows = [row for (row,) in self.conn.execute("SELECT row FROM chunks ORDER BY row")]
+        vectors = self._vectors_for_rows(rows) if rows else None
+        # New rows never exceed old ones, so renumbering in ascending order never collides
+        self.conn.executemany(
+            "UPDATE chunks SET row = ? WHERE row = ?",
+            [(new_row, old_row) for new_row, old_row in enumerate(rows) if new_row != old_row]
+        )
+        self.next_row = len(rows)
+        temporary_path = self.vectors_path + ".tmp"
+        with open(temporary_path, "wb") as handle:
+            if rows:
+                handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.raw_vectors = None
+        os.replace(temporary_path, self.vectors_path)
+
+        # The new index replaces any memory-mapped one
+        self.writable = True
+        if rows:
+            self.index = self._new_index(vectors)
+            self.index.add_with_ids(vectors, np.arange(len(rows), dtype=np.int64))
+        else:
+            self.index = None
+        self.tombstones = 0
+        self.dirty = True
+
+    def _undertrained(self):
+        # Indexes trained on a small first batch are retrained once the collection has grown
+        if self.index is None:
+            return False
+        if self.index_type == "pq" and isinstance(faiss.downcast_index(self.index.index), faiss.IndexPQ):
+            return False
+        if self.index_type == "pq" and self.index.ntotal >= FAISS_PQ_MIN_TRAIN:
+            return True
+        if self.index_type in QUANTIZED_INDEX_TYPES:
+            # SQ8 codes, including the stand-in for PQ on small collections, span the value
+            # range seen in training; retraining on each doubling keeps the total cost linear
+            return self.index.ntotal >= FAISS_SQ_RETRAIN_GROWTH * self.trained_on
+        if self.index_type == "ivf":
+            return min(FAISS_IVF_NLIST, self.index.ntotal // 39) >= 4 * self.index.nlist
+        return False
+
+    def _needs_rebuild(self):
+        if self.index is None:
+            return False
+        if self.tombstones > FAISS_COMPACT_RATIO * max(self.index.ntotal, 1):
+            return True
+        return self._undertrained()
+
+    def persist(self):
+        """Write the index atomically, then commit the side store"""
+        with self.lock:
+            if not self.dirty:
+                return
+            if self._needs_rebuild():
+                self.rebuild()
+
+            if self.index is None:
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+            else:
+                temporary_path = self.index_path + ".tmp"
+                faiss.write_index(self.index, temporary_path)
+                os.replace(temporary_path, self.index_path)
+
+            self._set_meta("index_type", self.index_type)
+            self._set_meta("next_row", self.next_row)
+            self._set_meta("tombstones", self.tombstones)
+            self._set_meta("dim", self.dim)
+            self._set_meta("trained_on", self.trained_on)
+            self.conn.commit()
+            self.dirty = False
+
+    def stats(self):
+        """Return record counts and the memory and disk footprint of the collection"""
+        with self.lock:
+            vectors = self.index.ntotal if self.index is not None else 0
+            index_bytes = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+            float_bytes = vectors * self.dim * 4
+            return {
+                "index_type": self.index_type,
+                "records": self.count(),
+                "vectors": vectors,
+                "tombstones": self.tombstones,
+                # The index is what queries keep in memory; raw vectors are only paged in for re-scoring
+                "index_bytes": index_bytes,
+                "raw_vector_bytes": os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0,
+                "side_store_bytes": os.path.getsize(os.path.join(self.path, "chunks.sqlite3")),
+                "float32_bytes": float_bytes,
+                "compression": float_bytes / index_bytes if index_bytes else None
+            }
+
+    def _dead_rows(self):
+        # Quantized collections keep a raw vector slot for every row ever written
+        return self.next_row - self.count() if self.quantized else self.tombstones
+
+    def needs_compaction(self):
+        """Return whether deleted rows make up more than FAISS_COMPACT_RATIO of the collection"""
+        with self.lock:
+            total = self.next_row if self.quantized else (self.index.ntotal if self.index is not None else 0)
+            return self._dead_rows() > FAISS_COMPACT_RATIO * max(total, 1)
+
+    def compact(self):
+        """Drop deleted vectors, including their raw vector slots, and shrink the side store"""
+        with self.lock:
+            if self.quantized and self._dead_rows():
+                self._pack_rows()
+            elif self.tombstones:
+                self.rebuild()
+            self.persist()
+            self.conn.execute("VACUUM")
+
+    def disk_bytes(self):
+        """Return the size of every file of the collection"""
+        with self.lock:
+            return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+
+    def close(self):
+        """Write pending changes and release the side store and the index"""
+        with self.lock:
+            self.persist()
+            self.conn.close()
+            self.index = None
+            self.raw_vectors = None
+
+    def recall_at_k(self, query_embeddings, k=10):
+        """Return the average fraction of the exact float32 top-k that query() returns"""
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        with self.lock:
+            rows = [row for (row,) in self.conn.execute("SELECT row FROM chunks")]
+            if not rows or len(queries) == 0:
+                return None
+            _, exact_rows = self._exact_search(queries, rows, k)
+            records = self._fetch_records(sorted({int(row) for row in exact_rows.ravel()}))
+        results = self.query(queries, n_results=k)
+
+        recalls = []
+        for query_rows, returned_ids in zip(exact_rows, results["ids"]):
+            expected = {records[int(row)][0] for row in query_rows}
+            recalls.append(len(expected & set(returned_ids)) / len(expected))
+        return float(np.mean(recalls))
@@ -0,0 +1,176 @@
+# services/vector_stores/memory_store.py
+import threading
+
+import numpy as np
+
+from services.vector_stores.store_base import BaseVectorStore
+
+class MemoryVectorStore(BaseVectorStore):
+    """Vector store held entirely in process memory as one NumPy matrix.
+
+    Meant for collections that are likely to be read by a single session and then dropped:
+    nothing touches the disk. Rows are kept dense; deleting a record moves the last row into
+    its place, so the matrix never needs compacting.
+    """
+
+    persistent = False
+
+    def __init__(self, collection_name):
+        super().__init__(collection_name)
+        self.lock = threading.RLock()
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.positions = {}
+        self.vectors = None
+        self.norms = None
+
+    def _reserve(self, count, dim):
+        # Grow geometrically so a stream of small upserts stays linear overall
+        if self.vectors is None:
+            self.vectors = np.empty((max(count, 1024), dim), dtype=np.float32)
+            self.norms = np.empty(len(self.vectors), dtype=np.float32)
+        elif count > len(self.vectors):
+            capacity = max(count, 2 * len(self.vectors))
+            vectors = np.empty((capacity, dim), dtype=np.float32)
+            vectors[:len(self.ids)] = self.vectors[:len(self.ids)]
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[:len(self.ids)] = self.norms[:len(self.ids)]
+            self.vectors, self.norms = vectors, norms
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Insert or replace records with precomputed embeddings"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self.lock:
+            self._reserve(len(self.ids) + len(ids), embeddings.shape[1])
+            rows = []
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                row = self.positions.get(chunk_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.positions[chunk_id] = row
+                    self.ids.append(chunk_id)
+                    self.documents.append(document)
+                    self.metadatas.append(dict(metadata or {}))
+                else:
+                    self.documents[row] = document
+                    self.metadatas[row] = dict(metadata or {})
+                rows.append(row)
+            rows = np.asarray(rows, dtype=np.int64)
+            self.vectors[rows] = embeddings
+            self.norms[rows] = (embeddings ** 2).sum(axis=1)
+
+    def update_metadatas(self, ids, metadatas):
+        """Replace the metadata of existing records"""
+        with self.lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self.positions.get(chunk_id)
+                if row is not None:
+                    self.metadatas[row] = dict(metadata or {})
+
+    def delete(self, ids):
+        """Delete records by id"""
+        with self.lock:
+            for chunk_id in ids:
+                row = self.positions.pop(chunk_id, None)
+                if row is None:
+                    continue
+                last = len(self.ids) - 1
+                if row != last:
+                    moved_id = self.ids[last]
+                    self.ids[row] = moved_id
+                    self.documents[row] = self.documents[last]
+                    self.metadatas[row] = self.metadatas[last]
+                    self.vectors[row] = self.vectors[last]
+                    self.norms[row] = self.norms[last]
+                    self.positions[moved_id] = row
+                self.ids.pop()
+                self.documents.pop()
+                self.metadatas.pop()
+
+    def _matching_rows(self, where):
+        # Equality and {"$in": [...]} filters on top-level metadata keys, as used by this app
+        conditions = [
+            (key, set(value["$in"]) if isinstance(value, dict) and "$in" in value else {value})
+            for key, value in where.items()
+        ]
+        return [
+            row for row, metadata in enumerate(self.metadatas)
+            if all(metadata.get(key) in allowed for key, allowed in conditions)
+        ]
+
+    def get(self, ids):
+        """Return the "ids", "documents" and "metadatas" of records by id"""
+        with self.lock:
+            found = [chunk_id for chunk_id in ids if chunk_id in self.positions]
+            return {
+                "ids": found,
+                "documents": [self.documents[self.positions[chunk_id]] for chunk_id in found],
+                "metadatas": [dict(self.metadatas[self.positions[chunk_id]]) for chunk_id in found]
+            }
+
+    def get_embeddings(self, ids):
+        """Return the stored embeddings of records as a matrix aligned with ids"""
+        with self.lock:
+            return self.vectors[[self.positions[chunk_id] for chunk_id in ids]] if len(ids) else np.zeros((0, 0), dtype=np.float32)
+
+    def get_ids(self, where=None):
+        """Return the ids of records whose metadata matches where"""
+        with self.lock:
+            if not where:
+                return list(self.ids)
+            return [self.ids[row] for row in self._matching_rows(where)]
+
+    def export(self):
+        """Return every record as ids, an embedding matrix, documents and metadatas"""
+        with self.lock:
+            count = len(self.ids)
+            vectors = self.vectors[:count].copy() if count else np.zeros((0, 0), dtype=np.float32)
+            return list(self.ids), vectors, list(self.documents), [dict(metadata) for metadata in self.metadatas]
+
+    def query(self, query_embeddings, n_results=5, where=None):
+        """Return the nearest records to each query embedding"""
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        with self.lock:
+            count = len(self.ids)
+            if not count:
+                return self.empty_results(len(queries))
+            if where:
+                rows = np.asarray(self._matching_rows(where), dtype=np.int64)
+                if not len(rows):
+                    return self.empty_results(len(queries))
+                vectors, norms = self.vectors[rows], self.norms[rows]
+            else:
+                # Slices are views; an unfiltered query copies nothing
+                rows = np.arange(count)
+                vectors, norms = self.vectors[:count], self.norms[:count]
+
+            # Squared L2, the same distance Chroma and the FAISS store report
+            distances = (queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T + norms[None, :]
+            k = min(n_results, len(rows))
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(rows) else np.tile(np.arange(len(rows)), (len(queries), 1))
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1, kind="stable")
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            nearest_distances = np.maximum(np.take_along_axis(nearest_distances, order, axis=1), 0)
+
+            results = self.empty_results(len(queries))
+            for query_index in range(len(queries)):
+                for position, distance in zip(nearest[query_index], nearest_distances[query_index]):
+                    row = int(rows[position])
+                    results["ids"][query_index].append(self.ids[row])
+                    results["documents"][query_index].append(self.documents[row])
+                    results["metadatas"][query_index].append(dict(self.metadatas[row]))
+                    results["distances"][query_index].append(float(distance))
+            return results
+
+    def count(self):
+        """Return the number of stored records"""
+        with self.lock:
+            return len(self.ids)
+
+    def disk_bytes(self):
+        """Return 0; nothing is written to disk"""
+        return 0
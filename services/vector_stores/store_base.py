@@ -0,0 +1,81 @@
+# services/vector_stores/store_base.py
+
+class BaseVectorStore:
+    """Base class for all vector store backends.
+
+    Query results use Chroma's layout: a dict of "ids", "documents", "metadatas" and
+    "distances", each holding one list per query embedding. Filters (where) map metadata
+    keys to a value or to {"$in": [values]}; a record must match every key.
+    """
+    
+    # Whether records survive a restart of the process
+    persistent = True
+    
+    def __init__(self, collection_name):
+        self.collection_name = collection_name
+    
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Insert or replace records - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement upsert")
+    
+    def update_metadatas(self, ids, metadatas):
+        """Replace the metadata of existing records - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement update_metadatas")
+    
+    def delete(self, ids):
+        """Delete records by id - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement delete")
+    
+    def get(self, ids):
+        """Return the "ids", "documents" and "metadatas" of records by id - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement get")
+    
+    def get_embeddings(self, ids):
+        """Return the stored embeddings of records as a matrix aligned with ids - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement get_embeddings")
+    
+    def get_ids(self, where=None):
+        """Return the ids of records whose metadata matches where - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement get_ids")
+    
+    def query(self, query_embeddings, n_results=5, where=None):
+        """Return the nearest records to each query embedding - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement query")
+    
+    def count(self):
+        """Return the number of stored records - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement count")
+    
+    def get_max_batch_size(self):
+        """Return the largest number of records accepted by a single upsert"""
+        return 5000
+    
+    def persist(self):
+        """Flush pending writes to disk; backends that write through need not override this"""
+        pass
+    
+    def compact(self):
+        """Reclaim space left by deleted records; backends that manage this themselves need not override this"""
+        pass
+    
+    def needs_compaction(self):
+        """Return whether deleted records take up enough space to be worth compacting"""
+        return False
+    
+    def disk_bytes(self):
+        """Return the bytes the collection occupies on disk, or None when the backend cannot tell"""
+        return None
+    
+    def close(self):
+        """Release files held open by the store"""
+        pass
+    
+    @staticmethod
+    def empty_results(query_count):
+        """Return a query result with no matches for each query"""
+        return {
+            "ids": [[] for _ in range(query_count)],
+            "documents": [[] for _ in range(query_count)],
+            "metadatas": [[] for _ in range(query_count)],
+            "distances": [[] for _ in range(query_count)]
+        }
@@ -0,0 +1,43 @@
+import os
+import atexit
+import hashlib
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+# Keep every store, index, cache and registry the tests write in a scratch directory.
+# Paths are read when the services are first imported, so they are set before any test module loads.
+_WORK_DIRECTORY = tempfile.mkdtemp(prefix="explainaai-tests-")
+atexit.register(shutil.rmtree, _WORK_DIRECTORY, ignore_errors=True)
+
+for variable, name in (
+    ("CHROMA_DB_PATH", "chroma_db"),
+    ("FAISS_STORE_PATH", "faiss_db"),
+    ("LEXICAL_INDEX_PATH", "lexical_index"),
+    ("COLLECTION_REGISTRY_PATH", "collection_registry/registry.sqlite3"),
+    ("SNAPSHOT_PATH", "snapshots"),
+    ("LLM_CACHE_PATH", "llm_cache/completions.sqlite3"),
+    ("EMBED_CACHE_PATH", "embedding_cache/embeddings.sqlite3"),
+):
+    os.environ[variable] = os.path.join(_WORK_DIRECTORY, name)
+
+def fake_embeddings(documents):
+    """Deterministic unit vectors, so no embedding model is needed"""
+    vectors = []
+    for document in documents:
+        seed = int(hashlib.sha256(document.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(384).astype(np.float32)
+        vectors.append(vector / np.linalg.norm(vector))
+    return np.asarray(vectors)
+
+@pytest.fixture(params=["faiss", "chroma"])
+def backend(request, monkeypatch):
+    """Run a test against each persistent backend, embedding with fake_embeddings"""
+    from services import vector_db
+    monkeypatch.setattr(vector_db, "VECTOR_STORE_BACKEND", request.param)
+    monkeypatch.setattr(vector_db, "embed_documents", fake_embeddings)
+    # Open stores are cached per process; start each test without the other backend's
+    monkeypatch.setattr(vector_db, "_vector_stores", {})
+    return request.param
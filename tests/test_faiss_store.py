@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from services.vector_stores.faiss_store import FaissVectorStore
+
+def _unit_vectors(rng, count, dim=384):
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _upsert(store, vectors, start):
+    ids = [f"chunk-{i}" for i in range(start, start + len(vectors))]
+    store.upsert(ids, vectors, [f"text {i}" for i in range(start, start + len(vectors))], [{} for _ in ids])
+
+# A first batch of a single vector used to fix the SQ8 value range for good
+@pytest.mark.parametrize("index_type", ["sq8", "pq"])
+@pytest.mark.parametrize("first_batch", [1, 5])
+def test_quantized_recall_after_small_first_batch(tmp_path, index_type, first_batch):
+    rng = np.random.default_rng(0)
+    vectors = _unit_vectors(rng, 3000)
+    queries = _unit_vectors(rng, 50)
+
+    store = FaissVectorStore("recall", directory=str(tmp_path), index_type=index_type)
+    _upsert(store, vectors[:first_batch], 0)
+    _upsert(store, vectors[first_batch:], first_batch)
+    assert store.recall_at_k(queries, k=10) >= 0.9
+
+    store.persist()
+    store.close()
+    reopened = FaissVectorStore("recall", directory=str(tmp_path), index_type=index_type)
+    assert reopened.recall_at_k(queries, k=10) >= 0.9
+
+def test_quantized_recall_with_many_small_batches(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = _unit_vectors(rng, 2000)
+    queries = _unit_vectors(rng, 50)
+
+    store = FaissVectorStore("batches", directory=str(tmp_path), index_type="sq8")
+    for start in range(0, len(vectors), 50):
+        _upsert(store, vectors[start:start + 50], start)
+        store.persist()
+    assert store.recall_at_k(queries, k=10) >= 0.9
+
+def test_compact_drops_raw_vectors_of_deleted_rows(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = _unit_vectors(rng, 1000)
+    queries = _unit_vectors(rng, 20)
+
+    store = FaissVectorStore("compact", directory=str(tmp_path), index_type="sq8")
+    _upsert(store, vectors, 0)
+    store.delete([f"chunk-{i}" for i in range(0, 1000, 2)])
+    store.persist()
+    assert store.needs_compaction()
+
+    before = store.recall_at_k(queries, k=10)
+    store.compact()
+    assert not store.needs_compaction()
+    assert store.stats()["raw_vector_bytes"] == 500 * 384 * 4
+    assert store.recall_at_k(queries, k=10) >= before - 0.05
+    kept = [f"chunk-{i}" for i in range(1, 1000, 2)]
+    np.testing.assert_allclose(store.get_embeddings(kept), vectors[1::2], atol=1e-6)
+
+    # New records go after the packed rows
+    _upsert(store, _unit_vectors(rng, 10), 1000)
+    store.persist()
+    assert store.count() == 510
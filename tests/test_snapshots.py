@@ -0,0 +1,60 @@
+import pytest
+
+from services import vector_db
+from services.global_index import GLOBAL_COLLECTION_NAME
+from services.snapshots import export_snapshot, import_snapshot
+
+from conftest import fake_embeddings
+
+def _ingest(name, source, count, ephemeral=False):
+    chunks = [f"Chunk {i} of {source} about topic {i % 7}." for i in range(count)]
+    metadata = {"source": source, "title": name, "type": "webpage"}
+    store, _ = vector_db.store_chunks_in_vector_db(chunks, name, metadata, ephemeral=ephemeral, summary=f"About {name}")
+    return store
+
+def _global_count():
+    return vector_db.get_vector_store(GLOBAL_COLLECTION_NAME).count()
+
+# Importing a snapshot under another name used to share global rows with the original collection
+def test_import_under_another_name_keeps_both_in_global_index(backend, tmp_path):
+    original, other, restored = f"orig-{backend}", f"other-{backend}", f"restored-{backend}"
+    start = _global_count()
+    _ingest(original, f"https://example.com/{backend}/original", 30)
+    _ingest(other, f"https://example.com/{backend}/other", 12)
+    assert _global_count() == start + 42
+
+    snapshot = export_snapshot(original, str(tmp_path / "snapshot"))
+    store, manifest, _ = import_snapshot(snapshot, restored)
+    assert store.count() == 30
+    assert manifest["summary"] == f"About {original}"
+    assert _global_count() == start + 72
+
+    vector_db.delete_collection(restored)
+    assert _global_count() == start + 42
+    results = vector_db.global_query_vector_db(
+        "topic 3", n_results=5, sources=[f"https://example.com/{backend}/original"],
+        query_embedding=fake_embeddings(["topic 3"])[0]
+    )
+    assert len(results["ids"][0]) == 5
+
+    vector_db.delete_collection(original)
+    vector_db.delete_collection(other)
+    assert _global_count() == start
+
+def test_export_unknown_collection_raises_without_creating_it(backend, tmp_path):
+    with pytest.raises(ValueError):
+        export_snapshot(f"missing-{backend}", str(tmp_path / "snapshot"))
+    assert vector_db.find_collection(f"missing-{backend}") == (None, None)
+    assert not (tmp_path / "snapshot").exists()
+
+def test_export_in_memory_collection(backend, tmp_path):
+    name, restored = f"memory-{backend}", f"from-memory-{backend}"
+    store = _ingest(name, f"https://example.com/{backend}/memory", 20, ephemeral=True)
+    assert not store.persistent
+
+    snapshot = export_snapshot(name, str(tmp_path / "snapshot"))
+    imported, manifest, _ = import_snapshot(snapshot, restored)
+    assert manifest["chunks"] == 20
+    assert manifest["summary"] == f"About {name}"
+    assert sorted(imported.get_ids()) == sorted(store.get_ids())
+    vector_db.delete_collection(restored)
@@ -0,0 +1,28 @@
+import random
+
+from utils.text_processing import split_into_token_chunks
+
+def _uncovered(text, chunks):
+    covered = [False] * len(text)
+    for chunk, start, end in chunks:
+        assert chunk == text[start:end]
+        for position in range(start, end):
+            covered[position] = True
+    return [position for position, character in enumerate(text) if not covered[position] and not character.isspace()]
+
+def test_line_opening_quotes_and_brackets_stay_in_chunks():
+    text = 'He said:\n"Hello there." Then left.\n(Note) more text here.'
+    chunks = split_into_token_chunks(text, max_tokens=5)
+    assert _uncovered(text, chunks) == []
+    assert any(chunk.startswith('"Hello') for chunk, _, _ in chunks)
+    assert any("(Note)" in chunk for chunk, _, _ in chunks)
+
+def test_every_non_whitespace_character_lands_in_a_chunk():
+    rng = random.Random(0)
+    pieces = ["word", "a", "3.14", "...", ".", "!", "?", '"', "'", "(", ")", "[", "]", " ", " ", " ", "\n", "\n\n", "\t"]
+    for _ in range(500):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 120)))
+        max_tokens = rng.randint(1, 12)
+        overlap_tokens = rng.randint(0, max_tokens)
+        chunks = split_into_token_chunks(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        assert _uncovered(text, chunks) == [], (text, max_tokens, overlap_tokens)
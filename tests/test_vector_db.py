@@ -0,0 +1,120 @@
+from services import vector_db
+from services.lexical_index import get_lexical_index
+
+def _chunks(name, count):
+    return [f"Chunk {i} of {name} about topic {i % 7}." for i in range(count)]
+
+def test_failed_upsert_batch_is_not_counted_or_indexed(backend, monkeypatch):
+    name = f"failing-{backend}"
+    store = vector_db.get_vector_store(name)
+    monkeypatch.setattr(store, "get_max_batch_size", lambda: 10)
+    upsert = store.upsert
+    calls = []
+
+    # The second batch fails; the first and third are stored
+    def flaky_upsert(ids, *args):
+        calls.append(ids)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        upsert(ids, *args)
+    monkeypatch.setattr(store, "upsert", flaky_upsert)
+
+    _, stats = vector_db.store_chunks_in_vector_db(_chunks(name, 30), name, {"source": f"https://example.com/{name}"})
+    assert stats["added"] == 20
+    assert store.count() == 20
+    lexical_index = get_lexical_index(name)
+    assert all(chunk_id in lexical_index for chunk_id in calls[0] + calls[2])
+    assert not any(chunk_id in lexical_index for chunk_id in calls[1])
+    vector_db.delete_collection(name)
+
+# Collections stored before the registry existed used to be recorded as expired and evicted at once
+def test_discovered_collections_are_not_expired(backend):
+    import os
+    import time
+
+    from services.collection_registry import get_collection_registry
+    from services.vector_stores.faiss_store import FAISS_STORE_PATH
+    from conftest import fake_embeddings
+
+    name = f"legacy-{backend}"
+    store = vector_db._open_store(name, backend)
+    documents = _chunks(name, 5)
+    store.upsert([f"{name}-{i}" for i in range(5)], fake_embeddings(documents), documents, [{"type": "webpage"} for _ in documents])
+    store.persist()
+    if backend == "faiss":
+        store.close()
+        long_ago = time.time() - 400 * 86400
+        os.utime(os.path.join(FAISS_STORE_PATH, name), (long_ago, long_ago))
+
+    registry = get_collection_registry()
+    assert registry.get(name) is None
+    assert name in vector_db.discover_collections()
+    record = registry.get(name)
+    assert 0 < record["last_access"] <= time.time()
+    assert name not in registry.plan_eviction()
+    vector_db.delete_collection(name)
+
+def test_pin_collection(backend):
+    from services.collection_registry import get_collection_registry
+
+    # Unknown or evicted collections are not created by pinning them
+    assert vector_db.pin_collection(f"unknown-{backend}") == (None, False)
+    assert vector_db.find_collection(f"unknown-{backend}") == (None, None)
+
+    name = f"pinned-{backend}"
+    memory_store, _ = vector_db.store_chunks_in_vector_db(
+        _chunks(name, 8), name, {"source": f"https://example.com/{name}"}, ephemeral=True
+    )
+    assert not memory_store.persistent
+    store, pinned = vector_db.pin_collection(name)
+    assert pinned and store.persistent and store.count() == 8
+    assert get_collection_registry().get(name)["pinned"]
+    vector_db.delete_collection(name)
+
+# Chroma rejects empty id lists; a collection without global rows used to stop halfway through deletion
+def test_delete_collection_without_global_rows(backend):
+    from services.collection_registry import get_collection_registry
+
+    name = f"no-global-{backend}"
+    vector_db._open_store(name, backend)
+    get_collection_registry().record(name, backend, 0, 0)
+    vector_db.delete_collection(name)
+    assert get_collection_registry().get(name) is None
+
+    # Unknown names are cleaned up the same way
+    vector_db.delete_collection(f"never-stored-{backend}")
+
+# Re-ingesting unchanged content should not rewrite the global index
+def test_reingest_only_syncs_changed_rows(backend, monkeypatch):
+    from services.global_index import GLOBAL_COLLECTION_NAME, global_chunk_id
+
+    name = f"reingest-{backend}"
+    source = f"https://example.com/{name}"
+    chunks = _chunks(name, 40)
+    store, _ = vector_db.store_chunks_in_vector_db(chunks, name, {"source": source})
+    global_store = vector_db.get_vector_store(GLOBAL_COLLECTION_NAME)
+    assert len(global_store.get_ids(where={"collection": name})) == 40
+
+    writes = []
+    for method in ("upsert", "update_metadatas", "delete"):
+        original = getattr(global_store, method)
+        def spy(ids, *args, method=method, original=original):
+            writes.append((method, list(ids)))
+            return original(ids, *args)
+        monkeypatch.setattr(global_store, method, spy)
+
+    vector_db.store_chunks_in_vector_db(chunks, name, {"source": source})
+    assert writes == []
+
+    # Drop one chunk, add one and move the rest: only those rows are written
+    changed = chunks[1:] + ["A brand new chunk."]
+    vector_db.store_chunks_in_vector_db(changed, name, {"source": source}, chunk_metadatas=[{"start": i} for i in range(40)])
+    dropped = global_chunk_id(name, vector_db.chunk_id_for(chunks[0], source))
+    added = global_chunk_id(name, vector_db.chunk_id_for("A brand new chunk.", source))
+    assert ("delete", [dropped]) in writes
+    assert any(method == "upsert" and ids == [added] for method, ids in writes)
+    global_ids = set(global_store.get_ids(where={"collection": name}))
+    assert len(global_ids) == 40 and dropped not in global_ids and added in global_ids
+    moved = global_store.get([global_chunk_id(name, vector_db.chunk_id_for(chunks[5], source))])
+    assert moved["metadatas"][0]["start"] == 4
+    vector_db.delete_collection(name)
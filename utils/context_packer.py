@@ -0,0 +1,128 @@
+# utils/context_packer.py
+import re
+
+from utils.text_processing import estimate_tokens
+
+# Separator placed between unrelated passages in the prompt
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+# A passage whose word 5-grams are mostly contained in an already selected one adds nothing new
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_CONTAINMENT = 0.8
+
+_WORD_RE = re.compile(r"\w+")
+
+class _Passage:
+    """A retrieved chunk, or several overlapping chunks merged into one span"""
+
+    def __init__(self, text, score, source=None, start=None, end=None):
+        self.text = text
+        self.score = score
+        self.source = source
+        self.start = start
+        self.end = end
+        self.shingles = None
+
+    def has_offsets(self):
+        return self.start is not None and self.end is not None
+
+    def extend(self, other):
+        # Chunk texts are exact slices of the source, so the part of other past our end is appended as is
+        if other.end > self.end:
+            self.text += other.text[max(self.end - other.start, 0):]
+            self.end = other.end
+        self.score = max(self.score, other.score)
+
+def _shingles(text):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _is_near_duplicate(passage, selected):
+    if passage.shingles is None:
+        passage.shingles = _shingles(passage.text)
+    if not passage.shingles:
+        return True
+    for other in selected:
+        if len(passage.shingles & other.shingles) >= NEAR_DUPLICATE_CONTAINMENT * len(passage.shingles):
+            return True
+    return False
+
+def _merge_overlapping(passages):
+    """Merge passages from the same source whose character spans overlap or touch"""
+    merged = []
+    positioned = sorted(
+        (passage for passage in passages if passage.has_offsets()),
+        key=lambda passage: (str(passage.source), passage.start)
+    )
+    current = None
+    for passage in positioned:
+        if current is not None and passage.source == current.source and passage.start <= current.end:
+            current.extend(passage)
+            continue
+        current = passage
+        merged.append(current)
+
+    merged.extend(passage for passage in passages if not passage.has_offsets())
+    return merged
+
+# Assemble retrieved chunks into the prompt's context section
+def pack_context(documents, metadatas=None, distances=None, max_tokens=3000):
+    """Merge overlapping chunks, drop near-duplicates and keep the best passages within max_tokens.
+
+    documents, metadatas and distances are the per-query lists returned by a Chroma query.
+    Chunks whose metadata carries start/end offsets are merged when they overlap or are adjacent
+    in the same source. Passages are chosen by retrieval score and returned in document order.
+    """
+    metadatas = metadatas or [None] * len(documents)
+    # Without distances, fall back to the retrieval rank
+    distances = distances or list(range(len(documents)))
+
+    passages = []
+    for document, metadata, distance in zip(documents, metadatas, distances):
+        if not document:
+            continue
+        metadata = metadata or {}
+        passages.append(_Passage(document, -distance, metadata.get("source"), metadata.get("start"), metadata.get("end")))
+
+    # Pick the best passages first, skipping repeats and anything that no longer fits
+    selected = []
+    remaining = max_tokens
+    separator_tokens = estimate_tokens(PASSAGE_SEPARATOR)
+    for passage in sorted(_merge_overlapping(passages), key=lambda passage: passage.score, reverse=True):
+        tokens = estimate_tokens(passage.text) + (separator_tokens if selected else 0)
+        if tokens > remaining or _is_near_duplicate(passage, selected):
+            continue
+        selected.append(passage)
+        remaining -= tokens
+
+    # Present passages in reading order so merged context flows naturally
+    selected.sort(key=lambda passage: (not passage.has_offsets(), str(passage.source), passage.start or 0))
+    return PASSAGE_SEPARATOR.join(passage.text for passage in selected)
+
+# Separator placed between the sections of different sources
+SOURCE_SEPARATOR = "\n\n===\n\n"
+
+# Assemble chunks retrieved from several sources, labelling each source's section
+def pack_grouped_context(groups, max_tokens=3000):
+    """Pack per-source groups of chunks (best source first) under a header naming each source.
+
+    Each group is a dict with "source", "title", "documents", "metadatas" and "distances",
+    as returned by services.global_index.group_results_by_source. Better sources get the
+    first claim on the budget.
+    """
+    sections = []
+    remaining = max_tokens
+    separator_tokens = estimate_tokens(SOURCE_SEPARATOR)
+    for group in groups:
+        header = f"SOURCE: {group.get('title') or group.get('source')} ({group.get('source')})\n"
+        budget = remaining - estimate_tokens(header) - (separator_tokens if sections else 0)
+        if budget <= 0:
+            break
+        text = pack_context(group["documents"], group["metadatas"], group["distances"], max_tokens=budget)
+        if not text:
+            continue
+        sections.append(header + text)
+        remaining -= estimate_tokens(header + text) + (separator_tokens if len(sections) > 1 else 0)
+    return SOURCE_SEPARATOR.join(sections)
@@ -0,0 +1,129 @@
+# utils/conversation_memory.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.text_processing import format_conversation_history, estimate_tokens, CHARS_PER_TOKEN
+
+# Token budget for the history inserted into each QA prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+# Number of most recent question/answer turns kept verbatim
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "4"))
+
+# Summaries are updated in the background so answering never waits for them
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="conversation-memory")
+
+class ConversationMemory:
+    """Conversation history with recent turns kept verbatim and older turns folded into a rolling summary.
+
+    summarize is called with the previous summary and the messages to fold in, rendered as text,
+    and returns the updated summary. Results starting with "Error" are discarded and retried later.
+    """
+
+    def __init__(self, summarize, recent_turns=HISTORY_RECENT_TURNS, max_tokens=HISTORY_TOKEN_BUDGET):
+        self.summarize = summarize
+        self.recent_messages = recent_turns * 2
+        self.max_tokens = max_tokens
+        self.summary = ""
+        self.messages = []
+        self.generation = 0
+        self.folding = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.messages) + (1 if self.summary else 0)
+
+    def add_message(self, role, content):
+        """Append a message and fold the oldest ones into the summary when there are too many"""
+        with self.lock:
+            self.messages.append({"role": role, "content": content})
+            self._schedule_fold()
+
+    def add_turn(self, question, answer):
+        """Append a question and its answer"""
+        with self.lock:
+            self.messages.append({"role": "user", "content": question})
+            self.messages.append({"role": "assistant", "content": answer})
+            self._schedule_fold()
+
+    def clear(self):
+        """Forget every message and the summary, discarding any summary still being computed"""
+        with self.lock:
+            self.summary = ""
+            self.messages = []
+            self.generation += 1
+            self.folding = False
+
+    def _schedule_fold(self):
+        # Caller holds the lock; only one fold runs at a time per conversation
+        overflow = len(self.messages) - self.recent_messages
+        if overflow <= 0 or self.folding:
+            return
+        self.folding = True
+        _summary_executor.submit(self._fold, self.generation, self.summary, self.messages[:overflow])
+
+    def _fold(self, generation, previous_summary, messages):
+        text = (
+            f"SUMMARY SO FAR:\n{previous_summary or 'None'}\n\n"
+            f"NEW MESSAGES:\n{format_conversation_history(messages)}"
+        )
+        try:
+            summary = self.summarize(text)
+        except Exception:
+            summary = None
+
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.folding = False
+            if not summary or summary.startswith("Error"):
+                # Keep the messages verbatim; the next message will trigger another attempt
+                return
+            self.summary = summary.strip()
+            del self.messages[:len(messages)]
+            self._schedule_fold()
+
+    def format(self, max_tokens=None):
+        """Render the summary and the newest messages within the token budget"""
+        max_tokens = max_tokens or self.max_tokens
+        with self.lock:
+            summary = self.summary
+            messages = list(self.messages)
+
+        if not summary and not messages:
+            return "No previous conversation."
+
+        parts = []
+        remaining = max_tokens
+        if summary:
+            # The summary may use at most a third of the budget so recent turns always fit
+            summary = _truncate_to_tokens(summary, max_tokens // 3)
+            parts.append(f"Summary of earlier conversation: {summary}\n\n")
+            remaining -= estimate_tokens(parts[0])
+
+        # Newest messages first, stopping once the budget is spent; messages waiting
+        # to be folded into the summary are the first to go
+        recent = []
+        for message in reversed(messages):
+            entry = format_conversation_history([message])
+            tokens = estimate_tokens(entry)
+            if tokens > remaining:
+                if not recent and remaining > 0:
+                    recent.append(_truncate_to_tokens(entry, remaining))
+                break
+            recent.append(entry)
+            remaining -= tokens
+
+        parts.extend(reversed(recent))
+        return "".join(parts)
+
+# Cut text to an estimated number of tokens at a word boundary
+def _truncate_to_tokens(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(max_tokens * CHARS_PER_TOKEN - 3, 0)]
+    if " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut + "..."
@@ -0,0 +1,39 @@
+# utils/reranking.py
+import os
+
+import numpy as np
+
+# Share of the MMR score given to relevance; the rest penalizes similarity to passages already chosen
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Pick a relevant but varied subset of retrieved candidates
+def mmr_select(query_embedding, candidate_embeddings, k, lambda_=MMR_LAMBDA, relevance=None):
+    """Return the indices of up to k candidates chosen by Maximal Marginal Relevance, in selection order.
+
+    Relevance defaults to the cosine similarity of each candidate to the query; pass relevance to
+    rank by another score (such as a fused hybrid score) scaled to about the same range.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if not len(candidates):
+        return []
+    k = min(k, len(candidates))
+
+    # Every pairwise similarity in one matrix product; its diagonal also gives the norms
+    gram = candidates @ candidates.T
+    norms = np.sqrt(np.maximum(np.diag(gram), 1e-12))
+    if relevance is None:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = (candidates @ query) / (norms * max(float(np.linalg.norm(query)), 1e-12))
+
+    # The greedy loop below only reads rows of the similarity matrix, pre-scaled by the redundancy weight
+    gain = lambda_ * np.asarray(relevance, dtype=np.float32)
+    penalties = (1 - lambda_) * gram / np.outer(norms, norms)
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    selected = []
+    for _ in range(k):
+        scores = gain - redundancy
+        scores[selected] = -np.inf
+        best = int(scores.argmax())
+        selected.append(best)
+        np.maximum(redundancy, penalties[best], out=redundancy)
+    return selected
@@ -21,4 +21,10 @@ def initialize_session_state():
     if 'vector_db' not in st.session_state:
         st.session_state.vector_db = None
     if 'collection_name' not in st.session_state:
-        st.session_state.collection_name = ""
\ No newline at end of file
+        st.session_state.collection_name = ""
+    if 'conversation_memory' not in st.session_state:
+        st.session_state.conversation_memory = None
+    if 'search_all_sources' not in st.session_state:
+        st.session_state.search_all_sources = False
+    if 'search_source_types' not in st.session_state:
+        st.session_state.search_source_types = []
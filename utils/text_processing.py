@@ -1,4 +1,194 @@
 # utils/text_processing.py
+import re
+import zlib
+from bisect import bisect_left, bisect_right
+
+# Offline token estimate: the Llama 3 tokenizer averages about 4 characters per token on English prose
+CHARS_PER_TOKEN = 4
+
+# Candidate sentence ends (punctuation with closing quotes/brackets) and line breaks; a quote
+# or bracket after a line break opens the next line, so it is not part of the break
+_BREAK_RE = re.compile(r"[.!?][\"')\]]*\s*|\n\s*")
+_WORD_RE = re.compile(r"\S+")
+
+# Token count used for prompt budgeting
+def estimate_tokens(text):
+    """Estimate the number of model tokens in text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+class _TextUnits:
+    """Sentence-sized spans of a text with running token counts"""
+    
+    def __init__(self, text, max_tokens):
+        self.starts = []
+        self.ends = []
+        self.prefix_tokens = [0]
+        self.paragraph_ends = []
+        self.sentence_ends = []
+        self.text = text
+        self.max_tokens = max_tokens
+        
+        text_length = len(text)
+        position = text_length - len(text.lstrip())
+        for match in _BREAK_RE.finditer(text, position):
+            break_start, break_end = match.span()
+            separator = match.group()
+            if separator[0] == "\n":
+                end = break_start
+                boundary = 2
+            else:
+                punctuation = separator.rstrip()
+                # Punctuation inside a token, such as "3.14" or the first dots of "..."
+                if len(punctuation) == len(separator) and break_end < text_length:
+                    continue
+                end = break_start + len(punctuation)
+                boundary = 2 if "\n" in separator else 1
+            while end > position and text[end - 1].isspace():
+                end -= 1
+            if end > position:
+                self._add(position, end, break_end, boundary)
+            position = break_end
+        
+        end = len(text.rstrip())
+        if end > position:
+            self._add(position, end, end, 2)
+    
+    # Units are counted together with the whitespace that follows them, so the sum over
+    # consecutive units never underestimates the text they span
+    def _add(self, start, end, next_start, boundary):
+        tokens = estimate_tokens(self.text[start:next_start])
+        if tokens > self.max_tokens:
+            # Fall back to single words for sentences that don't fit a chunk on their own
+            word_starts = [match.start() for match in _WORD_RE.finditer(self.text, start, end)]
+            word_ends = [match.end() for match in _WORD_RE.finditer(self.text, start, end)]
+            for index in range(len(word_starts) - 1):
+                tokens = estimate_tokens(self.text[word_starts[index]:word_starts[index + 1]])
+                self._append(word_starts[index], word_ends[index], tokens, 0)
+            start = word_starts[-1]
+            tokens = estimate_tokens(self.text[start:next_start])
+        self._append(start, end, tokens, boundary)
+    
+    def boundary_rank(self, index):
+        """Stable pseudo-random rank of the boundary after unit index"""
+        return zlib.crc32(self.text[self.starts[index]:self.ends[index]].encode("utf-8"))
+    
+    def _append(self, start, end, tokens, boundary):
+        if boundary:
+            index = len(self.starts)
+            self.sentence_ends.append(index)
+            if boundary == 2:
+                self.paragraph_ends.append(index)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.prefix_tokens.append(self.prefix_tokens[-1] + tokens)
+
+# Find the first word of the shortest tail of text[start:end] holding overlap_tokens tokens
+def _overlap_start(text, start, end, overlap_tokens):
+    # Jump to the first word start after the estimated position, then step back a word at a time
+    position = max(start, end - overlap_tokens * CHARS_PER_TOKEN)
+    while position < end and not text[position].isspace() and position > start and not text[position - 1].isspace():
+        position += 1
+    while position < end and text[position].isspace():
+        position += 1
+    while position > start:
+        if estimate_tokens(text[position:end]) >= overlap_tokens:
+            return position
+        while position > start and text[position - 1].isspace():
+            position -= 1
+        while position > start and not text[position - 1].isspace():
+            position -= 1
+    return None  # The tail would be the whole chunk, so don't overlap
+
+# Pack sentence units into chunk spans of at most max_tokens, preferring paragraph and sentence boundaries
+def _pack_spans(text, units, max_tokens, overlap_tokens):
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    starts = units.starts
+    ends = units.ends
+    prefix_tokens = units.prefix_tokens
+    
+    spans = []
+    unit_count = len(starts)
+    i = 0
+    next_unit = 0  # First unit not covered by the previous chunk
+    head_start = None  # Chunk start inside unit i - 1 when the chunk opens with overlap
+    head_tokens = 0
+    while next_unit < unit_count:
+        chunk_start = head_start if head_start is not None else starts[i]
+        
+        # Last unit that keeps the chunk within budget
+        j = bisect_right(prefix_tokens, prefix_tokens[i] + max_tokens - head_tokens) - 1
+        if j <= next_unit:
+            # The overlap leaves no room for new text, so start this chunk without it
+            i = next_unit
+            chunk_start = starts[i]
+            j = max(bisect_right(prefix_tokens, prefix_tokens[i] + max_tokens) - 1, i + 1)
+        j = min(j, unit_count)
+        
+        # Prefer to end at a paragraph, then a sentence, in the last third of the new text.
+        # The boundary is picked by content hash rather than position, so the same one wins
+        # wherever the chunk starts and an edit only moves the chunks around it
+        if j < unit_count:
+            min_end = next_unit + 2 * (j - next_unit) // 3
+            for boundaries in (units.paragraph_ends, units.sentence_ends):
+                lo = bisect_left(boundaries, min_end)
+                hi = bisect_right(boundaries, j - 1)
+                if lo < hi:
+                    j = min(boundaries[lo:hi], key=units.boundary_rank) + 1
+                    break
+        
+        chunk_end = ends[j - 1]
+        spans.append((chunk_start, chunk_end))
+        next_unit = j
+        head_start = None
+        head_tokens = 0
+        if j >= unit_count:
+            break
+        
+        # Open the next chunk with the tail of this one
+        next_start = _overlap_start(text, chunk_start, chunk_end, overlap_tokens) if overlap_tokens > 0 else None
+        if next_start is None:
+            i = j
+            continue
+        k = bisect_right(starts, next_start) - 1
+        if starts[k] == next_start:
+            i = k
+        else:
+            head_start = next_start
+            head_tokens = estimate_tokens(text[next_start:starts[k + 1]])
+            i = k + 1
+    
+    return spans
+
+# Split text once into several chunk granularities
+def split_into_chunk_spans(text, granularities):
+    """Split text into chunks for each (max_tokens, overlap_tokens) pair in granularities.
+
+    The text is scanned once and one list of (start, end) character spans is returned per
+    granularity. Consecutive chunks share at least overlap_tokens tokens of whole words.
+    """
+    units = _TextUnits(text, min(max_tokens for max_tokens, _ in granularities))
+    return [_pack_spans(text, units, max_tokens, overlap_tokens) for max_tokens, overlap_tokens in granularities]
+
+# Get the text of chunk spans
+def materialize_spans(text, spans):
+    """Return the chunk texts for a list of (start, end) spans"""
+    return [text[start:end] for start, end in spans]
+
+# Map fine-grained chunks to the coarse chunk they came from
+def assign_parent_spans(child_spans, parent_spans):
+    """Return, for each child span, the index of the parent span containing its midpoint"""
+    parent_starts = [start for start, _ in parent_spans]
+    return [max(bisect_right(parent_starts, (start + end) // 2) - 1, 0) for start, end in child_spans]
+
+# Split text into chunks measured in model tokens, preferring paragraph and sentence boundaries
+def split_into_token_chunks(text, max_tokens=1000, overlap_tokens=0):
+    """Split text into chunks of at most max_tokens estimated tokens.
+
+    Returns a list of (chunk_text, start, end) tuples where start and end are character
+    offsets into text. Consecutive chunks share at least overlap_tokens tokens of whole words.
+    """
+    spans = split_into_chunk_spans(text, [(max_tokens, overlap_tokens)])[0]
+    return [(text[start:end], start, end) for start, end in spans]
 
 # Function to split text into chunks of approximately equal size
 def split_into_chunks(text, max_chunk_size=1000, overlap=100):
@@ -36,9 +226,7 @@ def format_conversation_history(chat_history):
     if not chat_history:
         return "No previous conversation."
     
-    formatted_history = ""
-    for i, message in enumerate(chat_history):
-        role = "User" if message["role"] == "user" else "Assistant"
-        formatted_history += f"{role}: {message['content']}\n\n"
-    
-    return formatted_history
\ No newline at end of file
+    return "".join(
+        f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}\n\n"
+        for message in chat_history
+    )
\ No newline at end of file
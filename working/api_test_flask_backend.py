@@ -1,25 +1,29 @@
 # flask + html --> page.html
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 load_dotenv()  # load all the environment variables
 
 import os
+import sys
 import requests
 import json
 from youtube_transcript_api import YouTubeTranscriptApi
 import wikipediaapi
 import re 
-import time
 from bs4 import BeautifulSoup
 import urllib.parse
 
+# Share the Groq client (rate limiting, retries) with the Streamlit app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.llm_cache import get_completion_cache
+from services.groq_client import post_chat_completion, iter_stream_content
+from prompts.prompt_templates import conversation_summary_prompt
+from utils.conversation_memory import ConversationMemory
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Configure Groq API URL
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-
 # Global store for maintaining session data (in a production app, use Redis or a database)
 sessions = {}
 
@@ -131,18 +135,6 @@ Now answer the following question based on the above context and conversation hi
 {question}
 """
 
-# Function to format conversation history for the prompt
-def format_conversation_history(chat_history):
-    if not chat_history:
-        return "No previous conversation."
-    
-    formatted_history = ""
-    for i, message in enumerate(chat_history):
-        role = "User" if message["role"] == "user" else "Assistant"
-        formatted_history += f"{role}: {message['content']}\n\n"
-    
-    return formatted_history
-
 # Extract YouTube Transcript
 def extract_transcript_details(youtube_video_url):
     try:
@@ -227,11 +219,6 @@ def generate_groq_content(content_text, prompt, api_key, model="llama3-70b-8192"
     if not api_key:
         return "Error: API key is missing"
     
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
     data = {
         "model": model,
         "messages": [
@@ -248,32 +235,57 @@ def generate_groq_content(content_text, prompt, api_key, model="llama3-70b-8192"
         "max_tokens": 1000
     }
     
+    # Return instantly when the same request was answered before
+    cache = get_completion_cache()
+    cache_key = cache.key_for_request(data) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, data=json.dumps(data))
+        # Rate limits are retried with backoff inside the shared client
+        response = post_chat_completion(data, api_key)
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        elif response.status_code == 429:  # Rate limit error
-            time.sleep(5)  # Wait 5 seconds before retrying
-            return generate_groq_content(content_text, prompt, api_key, model)  # Retry
+            content = response.json()["choices"][0]["message"]["content"]
+            if cache:
+                cache.set(cache_key, content)
+            return content
         else:
             return f"Error: {response.status_code}, {response.text}"
     except Exception as e:
         return f"Error making API call: {str(e)}"
 
+# Stream a chat completion token by token
+def stream_groq_content(data, api_key):
+    try:
+        response = post_chat_completion(dict(data, stream=True), api_key)
+        if response.status_code != 200:
+            yield f"Error: {response.status_code}, {response.text}"
+            return
+        yield from iter_stream_content(response)
+    except Exception as e:
+        yield f"Error making API call: {str(e)}"
+
+# Conversation memory that folds older turns into a summary with the session's API key
+def create_conversation_memory(api_key):
+    return ConversationMemory(
+        lambda text: generate_groq_content(text, conversation_summary_prompt, api_key, model="llama3-8b-8192")
+    )
+
 # Answer questions based on extracted content with memory of past conversations
-def answer_question(session_id, question, api_key):
+# With stream=True a generator of text fragments is returned instead of the full answer
+def answer_question(session_id, question, api_key, stream=False):
     if session_id not in sessions:
-        return "Error: No active session found. Please process a URL first."
+        error = "Error: No active session found. Please process a URL first."
+        return iter([error]) if stream else error
     
     session_data = sessions[session_id]
     context = session_data.get("extracted_content", "")
     summary = session_data.get("summary", "")
     
-    # Get conversation history (excluding the initial system message)
-    conversation_history = session_data.get("chat_history", [])[1:] if len(session_data.get("chat_history", [])) > 1 else []
-    
-    # Format the conversation history
-    formatted_history = format_conversation_history(conversation_history)
+    # Recent turns verbatim plus a summary of older ones, within the history token budget
+    formatted_history = session_data["memory"].format()
     
     # Prepare the prompt with context, conversation history, and question
     formatted_prompt = qa_prompt.format(
@@ -284,14 +296,10 @@ def answer_question(session_id, question, api_key):
     )
     
     if not api_key:
-        return "Error: API key is missing"
+        error = "Error: API key is missing"
+        return iter([error]) if stream else error
     
     # Generate answer using Groq API with memory-aware prompt
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
     data = {
         "model": "llama3-70b-8192",
         "messages": [
@@ -308,8 +316,11 @@ def answer_question(session_id, question, api_key):
         "max_tokens": 1000
     }
     
+    if stream:
+        return stream_groq_content(data, api_key)
+    
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, data=json.dumps(data))
+        response = post_chat_completion(data, api_key)
         if response.status_code == 200:
             return response.json()["choices"][0]["message"]["content"]
         else:
@@ -328,8 +339,6 @@ def process_large_content(content, content_type, api_key):
     for chunk in chunks:
         chunk_summary = generate_groq_content(chunk, chunk_prompt, api_key, "llama3-8b-8192")  # Using smaller model for chunks
         chunk_summaries.append(chunk_summary)
-        # Add a delay to respect rate limits
-        time.sleep(1)
     
     # Combine chunk summaries
     combined_summaries = "\n\n--- SECTION SUMMARY " + " ---\n\n--- SECTION SUMMARY ".join(chunk_summaries) + " ---\n\n"
@@ -380,6 +389,7 @@ def process_url(url, api_key):
                 "extracted_content": content,
                 "page_title": page_title,
                 "summary": summary,
+                "memory": create_conversation_memory(api_key),
                 "chat_history": [{
                     "role": "assistant", 
                     "content": f"I've analyzed the content from {content_source}. Here's a summary:\n\n{summary}\n\nYou can now ask me questions about this content!"
@@ -415,6 +425,7 @@ def process_url(url, api_key):
                 "extracted_content": content,
                 "page_title": page_title,
                 "summary": summary,
+                "memory": create_conversation_memory(api_key),
                 "chat_history": [{
                     "role": "assistant", 
                     "content": f"I've analyzed the content from {content_source}. Here's a summary:\n\n{summary}\n\nYou can now ask me questions about this content!"
@@ -449,6 +460,7 @@ def process_url(url, api_key):
                 "extracted_content": content,
                 "page_title": page_title,
                 "summary": summary,
+                "memory": create_conversation_memory(api_key),
                 "chat_history": [{
                     "role": "assistant", 
                     "content": f"I've analyzed the content from {content_source}. Here's a summary:\n\n{summary}\n\nYou can now ask me questions about this content!"
@@ -547,6 +559,7 @@ def api_ask_question():
     
     # Add assistant response to chat history
     sessions[session_id]["chat_history"].append({"role": "assistant", "content": answer})
+    sessions[session_id]["memory"].add_turn(question, answer)
     
     return jsonify({
         "session_id": session_id,
@@ -554,6 +567,53 @@ def api_ask_question():
         "chat_history": sessions[session_id]["chat_history"]
     }), 200
 
+# Route to ask a question and receive the answer as server-sent events
+@app.route('/api/ask/stream', methods=['POST'])
+def api_ask_question_stream():
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    session_id = data.get('session_id')
+    question = data.get('question')
+    api_key = data.get('api_key')
+    
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+    
+    if not question:
+        return jsonify({"error": "Question is required"}), 400
+    
+    if not api_key:
+        return jsonify({"error": "Groq API key is required"}), 400
+    
+    if session_id not in sessions:
+        return jsonify({"error": "Invalid session ID or session expired"}), 404
+    
+    # Add user question to chat history
+    sessions[session_id]["chat_history"].append({"role": "user", "content": question})
+    
+    def generate():
+        # Send each token as a "token" event and finish with the full answer
+        parts = []
+        for token in answer_question(session_id, question, api_key, stream=True):
+            parts.append(token)
+            yield f"event: token\ndata: {json.dumps({'content': token})}\n\n"
+        
+        answer = "".join(parts)
+        
+        # Add assistant response to chat history once the stream is complete
+        sessions[session_id]["chat_history"].append({"role": "assistant", "content": answer})
+        sessions[session_id]["memory"].add_turn(question, answer)
+        yield f"event: done\ndata: {json.dumps({'session_id': session_id, 'answer': answer})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Route to get session information
 @app.route('/api/session/<session_id>', methods=['GET'])
 def api_get_session(session_id):
@@ -593,6 +653,7 @@ def api_clear_conversation():
         sessions[session_id]["chat_history"] = [initial_message]
     else:
         sessions[session_id]["chat_history"] = []
+    sessions[session_id]["memory"].clear()
     
     return jsonify({
         "session_id": session_id,
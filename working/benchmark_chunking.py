@@ -0,0 +1,43 @@
+# Microbenchmark the token-budget chunker against the character-count splitter
+# Usage: python working/benchmark_chunking.py [megabytes]
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_processing import split_into_chunks, split_into_token_chunks, split_into_chunk_spans
+
+MEGABYTES = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+# Build a synthetic article with sentences and paragraphs
+random.seed(0)
+vocabulary = ("the of and to in is was for that with as on by at from his an were are which this "
+              "transformer attention retrieval summarization 2024 3.14 network, model. Wikipedia (see) "
+              "embedding vector database identifier_name token budget paragraph sentence.").split()
+paragraphs = []
+size = 0
+while size < MEGABYTES * 1024 * 1024:
+    sentences = []
+    for _ in range(random.randint(3, 8)):
+        words = random.choices(vocabulary, k=random.randint(8, 30))
+        sentences.append(" ".join(words).capitalize() + ".")
+    paragraph = " ".join(sentences)
+    paragraphs.append(paragraph)
+    size += len(paragraph) + 2
+text = "\n\n".join(paragraphs)
+
+def measure(label, function):
+    start = time.perf_counter()
+    chunks = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:6.2f}s  {len(chunks)} chunks")
+
+print(f"Text size: {len(text) / 1024 / 1024:.1f} MB")
+measure("split_into_chunks(4000)", lambda: split_into_chunks(text, max_chunk_size=4000))
+measure("split_into_token_chunks(1000)", lambda: split_into_token_chunks(text, max_tokens=1000))
+measure("split_into_chunks(1000, overlap=100)", lambda: split_into_chunks(text, max_chunk_size=1000, overlap=100))
+measure("split_into_token_chunks(250, overlap=25)", lambda: split_into_token_chunks(text, max_tokens=250, overlap_tokens=25))
+measure("both splits, two calls (before)", lambda: split_into_chunks(text, max_chunk_size=4000) + split_into_chunks(text, max_chunk_size=1000, overlap=100))
+measure("split_into_chunk_spans, one pass", lambda: sum(split_into_chunk_spans(text, [(1000, 0), (250, 25)]), []))
@@ -0,0 +1,43 @@
+# Measure embedding throughput (chunks/sec) from 1 to N workers with the process and thread backends
+# Usage: python working/benchmark_embedding.py [chunks] [max_workers]
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_workers import ParallelEmbeddingFunction, _load_model
+
+CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+MAX_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+# Chunks of roughly 250 tokens, like the vector chunks produced during ingestion
+random.seed(0)
+vocabulary = ("the of and to in is was for that with as on by at from his an were are which this "
+              "transformer attention retrieval summarization network model embedding vector database "
+              "token budget paragraph sentence video transcript article history science").split()
+chunks = [" ".join(random.choices(vocabulary, k=180)) + "." for _ in range(CHUNKS)]
+
+def measure(label, function):
+    start = time.perf_counter()
+    vectors = function(chunks)
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(chunks)
+    print(f"{label:<28} {elapsed:7.2f}s  {len(chunks) / elapsed:8.1f} chunks/sec")
+
+print(f"{CHUNKS} chunks, {os.cpu_count()} CPUs")
+
+# Baseline: the default embedding function on the calling thread
+model = _load_model()
+model(chunks[:8])
+measure("single thread (baseline)", model)
+
+worker_counts = sorted({1, *[2 ** i for i in range(1, MAX_WORKERS.bit_length()) if 2 ** i <= MAX_WORKERS], MAX_WORKERS})
+for backend in ("process", "thread"):
+    for workers in worker_counts:
+        function = ParallelEmbeddingFunction(workers=workers, backend=backend)
+        # Model loading happens once per worker and is not part of the steady-state rate
+        function.warm_up()
+        measure(f"{backend} x{workers}", function)
+        function.shutdown()
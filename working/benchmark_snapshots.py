@@ -0,0 +1,87 @@
+# Measure how long exporting and restoring a processed document takes through snapshots
+# Usage: python working/benchmark_snapshots.py [chunks] [backend]
+# The collection is built from synthetic embeddings, so no model has to be downloaded.
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+BACKEND = sys.argv[2] if len(sys.argv) > 2 else "faiss"
+DIMENSION = 384
+
+# Keep every store, index and registry of the run in a scratch directory
+WORK_DIRECTORY = tempfile.mkdtemp(prefix="snapshot-benchmark-")
+os.environ["VECTOR_STORE_BACKEND"] = BACKEND
+os.environ["CHROMA_DB_PATH"] = os.path.join(WORK_DIRECTORY, "chroma_db")
+os.environ["FAISS_STORE_PATH"] = os.path.join(WORK_DIRECTORY, "faiss_db")
+os.environ["LEXICAL_INDEX_PATH"] = os.path.join(WORK_DIRECTORY, "lexical_index")
+os.environ["COLLECTION_REGISTRY_PATH"] = os.path.join(WORK_DIRECTORY, "registry.sqlite3")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import vector_db
+from services.snapshots import export_snapshot, import_snapshot
+from services.lexical_index import get_lexical_index
+from services.collection_registry import get_collection_registry
+
+def build_collection(collection_name):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((CHUNKS, DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    source = "https://example.com/benchmark"
+    documents = [f"Synthetic chunk {i} about topic {i % 97} " + "lorem ipsum dolor sit amet " * 36 for i in range(CHUNKS)]
+    ids = [vector_db.chunk_id_for(document, source) for document in documents]
+    metadatas = [
+        {"source": source, "source_key": vector_db.normalize_url(source), "title": "Benchmark", "type": "webpage",
+         "start": i * 900, "end": i * 900 + 1000, "parent_chunk": i // 16, "chunk_hash": vector_db.chunk_hash(document)}
+        for i, document in enumerate(documents)
+    ]
+    store = vector_db.get_vector_store(collection_name)
+    batch_size = store.get_max_batch_size()
+    for i in range(0, CHUNKS, batch_size):
+        store.upsert(ids[i:i + batch_size], vectors[i:i + batch_size], documents[i:i + batch_size], metadatas[i:i + batch_size])
+    store.persist()
+    lexical_index = get_lexical_index(collection_name)
+    lexical_index.update(added=zip(ids, documents))
+    lexical_index.persist()
+    get_collection_registry().record(
+        collection_name, BACKEND, store.count(), store.disk_bytes() or 0,
+        source=source, title="Benchmark", content_type="webpage", summary="A synthetic document."
+    )
+    vector_db.sync_global_index(collection_name, store)
+    return ids, vectors, documents
+
+if __name__ == "__main__":
+    try:
+        collection_name = vector_db.collection_name_for_url("https://example.com/benchmark")
+        ids, vectors, documents = build_collection(collection_name)
+        sample = np.random.default_rng(1).choice(CHUNKS, 100, replace=False)
+
+        start = time.perf_counter()
+        snapshot = export_snapshot(collection_name, os.path.join(WORK_DIRECTORY, "snapshot"))
+        export_seconds = time.perf_counter() - start
+        size = sum(entry.stat().st_size for entry in os.scandir(snapshot))
+
+        # Wipe everything the document left behind, as after a cache wipe or on a new host
+        vector_db.delete_collection(collection_name)
+
+        store, manifest, stats = import_snapshot(snapshot)
+        # Every chunk should come back with exactly the text and vector it was exported with
+        restored = store.get([ids[i] for i in sample])
+        intact = (
+            store.count() == CHUNKS
+            and restored["documents"] == [documents[ids.index(chunk_id)] for chunk_id in restored["ids"]]
+            and np.allclose(store.get_embeddings(restored["ids"]), vectors[[ids.index(chunk_id) for chunk_id in restored["ids"]]], atol=1e-6)
+        )
+        print(
+            f"{BACKEND}: {CHUNKS} chunks, snapshot {size / 1024 / 1024:.1f} MB, export {export_seconds:.2f}s, "
+            f"import {stats['total_seconds']:.2f}s (store {stats['write_seconds']:.2f}s, "
+            f"keyword index {stats['lexical_seconds']:.2f}s, global index {stats['global_seconds']:.2f}s), "
+            f"chunks intact {intact}, summary {manifest['summary']!r}"
+        )
+    finally:
+        shutil.rmtree(WORK_DIRECTORY, ignore_errors=True)
@@ -0,0 +1,56 @@
+# Benchmark the chunk summarization map stage against a local mock Groq endpoint
+# Usage: python working/benchmark_summarization.py [num_chunks] [latency_seconds]
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+NUM_CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    """Answers every chat completion after a fixed delay"""
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(MOCK_LATENCY)
+        body = json.dumps({"choices": [{"message": {"content": "mock summary"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), MockGroqHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# Point the service at the mock server before importing it
+os.environ["GROQ_API_URL"] = f"http://127.0.0.1:{server.server_port}/openai/v1/chat/completions"
+os.environ.setdefault("GROQ_API_KEY", "mock-key")
+# Keep the client-side rate limiter out of the measurement
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "100000000")
+os.environ.setdefault("GROQ_POOL_SIZE", "8")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_service import summarize_chunks
+from prompts.prompt_templates import chunk_prompt
+
+chunks = [f"chunk {i} " * 200 for i in range(NUM_CHUNKS)]
+
+for workers in (1, 2, 4, 8):
+    start = time.perf_counter()
+    summaries = summarize_chunks(chunks, chunk_prompt, max_workers=workers)
+    elapsed = time.perf_counter() - start
+    assert len(summaries) == NUM_CHUNKS
+    print(f"workers={workers:<2} chunks={NUM_CHUNKS} elapsed={elapsed:.2f}s")
+
+server.shutdown()
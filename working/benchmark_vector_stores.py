@@ -0,0 +1,105 @@
+# Compare ingest throughput, query latency, memory and recall of the Chroma, FAISS and in-memory vector stores
+# Usage: python working/benchmark_vector_stores.py [chunks] [queries]
+# Each backend runs in its own process so resident memory is measured separately.
+# A few thousand chunks is the size of one page's ephemeral collection; compare "memory" with the persistent backends there.
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+DIMENSION = 384
+BACKENDS = ["memory", "chroma", "faiss:flat", "faiss:hnsw", "faiss:ivf", "faiss:sq8", "faiss:pq"]
+
+def rss_megabytes():
+    # Current resident set size from /proc, falling back to the peak on other platforms
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_corpus():
+    rng = np.random.default_rng(0)
+    # Clustered around topics like real sentence embeddings; uniform random vectors are a worst case for ANN indexes
+    topics = rng.standard_normal((200, DIMENSION)).astype(np.float32)
+    vectors = topics[rng.integers(0, len(topics), CHUNKS)] + 0.6 * rng.standard_normal((CHUNKS, DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(CHUNKS, QUERIES, replace=False)] + 0.05 * rng.standard_normal((QUERIES, DIMENSION)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(CHUNKS)]
+    documents = [f"Synthetic chunk {i} " + "lorem ipsum dolor sit amet " * 36 for i in range(CHUNKS)]
+    metadatas = [{"source": f"https://example.com/{i % 50}", "start": i * 1000, "end": i * 1000 + 1000} for i in range(CHUNKS)]
+    return ids, vectors, documents, metadatas, queries
+
+def open_store(backend, directory):
+    if backend == "memory":
+        from services.vector_stores.memory_store import MemoryVectorStore
+        return MemoryVectorStore("benchmark")
+    if backend == "chroma":
+        import chromadb
+        from services.vector_stores.chroma_store import ChromaVectorStore
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.get_or_create_collection(name="benchmark", embedding_function=None)
+        return ChromaVectorStore(collection, client.get_max_batch_size())
+    from services.vector_stores.faiss_store import FaissVectorStore
+    return FaissVectorStore("benchmark", directory=directory, index_type=backend.split(":")[1])
+
+def run_backend(backend):
+    directory = tempfile.mkdtemp(prefix="vector-store-benchmark-")
+    try:
+        ids, vectors, documents, metadatas, queries = make_corpus()
+        baseline_rss = rss_megabytes()
+
+        store = open_store(backend, directory)
+        start = time.perf_counter()
+        batch_size = store.get_max_batch_size()
+        for i in range(0, CHUNKS, batch_size):
+            store.upsert(ids[i:i + batch_size], vectors[i:i + batch_size], documents[i:i + batch_size], metadatas[i:i + batch_size])
+        store.persist()
+        ingest_seconds = time.perf_counter() - start
+
+        # Reopen so FAISS serves queries from the memory-mapped index; the memory store cannot be reopened
+        if store.persistent:
+            del store
+            store = open_store(backend, directory)
+        store.query(queries[:1], n_results=10)
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.query([query], n_results=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        rss = rss_megabytes() - baseline_rss
+
+        # FAISS stores can measure recall against an exact float32 search and report their footprint
+        details = ""
+        if hasattr(store, "recall_at_k"):
+            stats = store.stats()
+            details = f"   recall@10 {store.recall_at_k(queries[:50], k=10):.3f}   index {stats['index_bytes'] / 1024 / 1024:7.1f} MB"
+
+        print(
+            f"{backend:<12} ingest {CHUNKS / ingest_seconds:9.0f} chunks/s   "
+            f"query p50 {np.percentile(latencies, 50):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms   "
+            f"RSS +{rss:7.1f} MB{details}"
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[3] == "--backend":
+        run_backend(sys.argv[4])
+    else:
+        print(f"{CHUNKS} chunks, {DIMENSION} dimensions, {QUERIES} queries, k=10")
+        for backend in BACKENDS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), str(CHUNKS), str(QUERIES), "--backend", backend], check=False)